@@ -0,0 +1,86 @@
+"""Serialization benchmark for the list endpoints.
+
+Compares FastAPI's default path (jsonable_encoder + stdlib json) with the
+orjson path in responses.py on a synthetic transactions payload, and reports
+bytes on the wire for each content encoding.
+
+    python bench_responses.py [rows]
+"""
+
+import json
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+from fastapi.encoders import jsonable_encoder
+
+from responses import brotli, encode_json
+
+CATEGORIES = ["FOOD_AND_DRINK", "GENERAL_MERCHANDISE", "TRAVEL", "ENTERTAINMENT", "PERSONAL_CARE"]
+MERCHANTS = ["Wolt", "Starbucks", "Lidl", "Zara", "H&M", "Uber", "Spotify", "Netflix", "Bolt Food", "Rimi"]
+
+
+def make_transactions(rows: int):
+    rng = random.Random(42)
+    today = date.today()
+    transactions = []
+    for i in range(rows):
+        category = rng.choice(CATEGORIES)
+        transactions.append(
+            {
+                "id": f"txn_{i:08d}",
+                "name": rng.choice(MERCHANTS),
+                "amount": round(rng.uniform(1, 120), 2),
+                "date": (today - timedelta(days=rng.randint(0, 90))).isoformat(),
+                "primary_category": category,
+                "detailed_category": f"{category}_OTHER",
+                "confidence": "HIGH",
+                "logo_url": None,
+                "is_mock": False,
+            }
+        )
+    return {"transactions": transactions}
+
+
+def default_path(content) -> bytes:
+    # Mirrors fastapi.responses.JSONResponse.render after route serialization
+    return json.dumps(
+        jsonable_encoder(content),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def timed(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    payload = make_transactions(rows)
+
+    print(f"{rows} transactions")
+    print(f"{'path':<28}{'ms':>10}{'bytes':>12}")
+    cases = [
+        ("jsonable_encoder + json", lambda: (default_path(payload), None)),
+        ("orjson", lambda: encode_json(payload)),
+        ("orjson + gzip", lambda: encode_json(payload, "gzip")),
+    ]
+    if brotli is not None:
+        cases.append(("orjson + br", lambda: encode_json(payload, "br")))
+
+    for label, fn in cases:
+        body, _ = fn()
+        print(f"{label:<28}{timed(fn):>10.2f}{len(body):>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Memory and scan benchmark for transaction batches.
+
+Compares a list of per-transaction dicts with the columnar TransactionBatch
+in transactions.py on a synthetic payload: retained bytes per row, the
+contract forecast scan, and serialization straight from the columns
+(``to_json``) against expanding to dicts and encoding those.
+
+    python bench_transactions.py [rows]
+"""
+
+import sys
+import tracemalloc
+
+import orjson
+from datetime import date, timedelta
+
+from bench_responses import make_transactions, timed
+from forecast import forecast_contracts
+from transactions import TransactionBatch
+
+
+def retained_bytes(build) -> int:
+    tracemalloc.start()
+    value = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del value
+    return size
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    today = date.today()
+    contracts = [
+        {
+            "category": "FOOD_AND_DRINK",
+            "start_date": (today - timedelta(days=30)).isoformat(),
+            "end_date": (today + timedelta(days=d)).isoformat(),
+            "spending_limit": 500.0,
+        }
+        for d in range(100)
+    ]
+
+    dict_bytes = retained_bytes(lambda: make_transactions(rows)["transactions"])
+    transactions = make_transactions(rows)["transactions"]
+    batch_bytes = retained_bytes(lambda: TransactionBatch.from_dicts(transactions))
+    batch = TransactionBatch.from_dicts(transactions)
+
+    print(f"{rows} transactions, {len(contracts)} contracts")
+    print(f"{'':<28}{'bytes/row':>12}")
+    print(f"{'dicts':<28}{dict_bytes / rows:>12.1f}")
+    print(f"{'TransactionBatch':<28}{batch_bytes / rows:>12.1f}")
+    print()
+    print(f"{'operation':<28}{'ms':>10}")
+    print(f"{'forecast_contracts':<28}{timed(lambda: forecast_contracts(contracts, batch, today)):>10.2f}")
+    print(f"{'sorted_newest_first':<28}{timed(batch.sorted_newest_first):>10.2f}")
+    print(f"{'to_json':<28}{timed(batch.to_json):>10.2f}")
+    print(f"{'to_dicts + orjson.dumps':<28}{timed(lambda: orjson.dumps(batch.to_dicts())):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
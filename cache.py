@@ -0,0 +1,66 @@
+"""Small in-process read-through cache.
+
+Values are loaded on first use and kept for ``ttl_seconds``. Writers call
+``invalidate``/``clear`` after changing the underlying rows; the TTL bounds
+staleness in other worker processes, which do not see those invalidations.
+Cached values are shared between callers and must be treated as read-only.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Generic, Hashable, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class ReadThroughCache(Generic[K, V]):
+    def __init__(
+        self,
+        loader: Callable[[K], V],
+        ttl_seconds: float,
+        max_entries: int = 1024,
+        cache_none: bool = True,
+    ) -> None:
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.cache_none = cache_none
+        self._lock = threading.Lock()
+        self._entries: Dict[K, Tuple[float, V]] = {}
+        # Bumped on every invalidation so a load that raced with a write
+        # does not put the old value back.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: K) -> V:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = self.loader(key)
+        if value is None and not self.cache_none:
+            return value
+
+        with self._lock:
+            if generation == self._generation:
+                if key not in self._entries and len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        return value
+
+    def invalidate(self, key: K) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
@@ -0,0 +1,210 @@
+"""Opt-in sampling profiler for individual requests.
+
+Enabled with ``PROFILING_ENABLED=1``. A request is profiled when either
+
+- it carries ``X-Profile: 1`` plus ``X-Admin-Token: $ADMIN_TOKEN``, or
+- it is picked by ``PROFILE_SAMPLE_RATE`` (0..1, default 0), for continuous
+  low-rate profiling of production traffic.
+
+While the handler runs, a background thread samples the handler's stack every
+``PROFILE_INTERVAL_MS`` and the result is written in collapsed-stack format
+(``frame;frame;frame count``), which speedscope and flamegraph.pl both read.
+At most ``PROFILE_MAX_FILES`` profiles are kept in ``PROFILE_DIR``.
+"""
+
+import contextlib
+import contextvars
+import hmac
+import inspect
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from fastapi.routing import APIRoute
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_SUFFIX = ".collapsed"
+
+
+def admin_token_ok(token: Optional[str]) -> bool:
+    expected = os.getenv("ADMIN_TOKEN")
+    return bool(expected and token and hmac.compare_digest(token, expected))
+
+
+class StackSampler:
+    """Samples the stacks of the threads attached to one request."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._threads: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    @contextlib.contextmanager
+    def attach(self) -> Iterator[None]:
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = self._threads.get(ident, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads[ident] -= 1
+                if not self._threads[ident]:
+                    del self._threads[ident]
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                idents = [ident for ident in self._threads if ident != own]
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.samples[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame: Any) -> str:
+        stack: List[str] = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+_current_sampler: contextvars.ContextVar[Optional[StackSampler]] = contextvars.ContextVar(
+    "profile_sampler", default=None
+)
+
+
+class ProfiledRoute(APIRoute):
+    """Route class that attaches the endpoint's thread to the active sampler.
+
+    Sync endpoints run in the threadpool, so the sampler has to learn the
+    worker thread from inside the call; the contextvar set by the middleware
+    is copied into that thread.
+    """
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        if PROFILING_ENABLED:
+            endpoint = _attach_sampler(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _attach_sampler(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    if inspect.iscoroutinefunction(endpoint):
+
+        @wraps(endpoint)
+        async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+            sampler = _current_sampler.get()
+            if sampler is None:
+                return await endpoint(*args, **kwargs)
+            with sampler.attach():
+                return await endpoint(*args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(endpoint)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        sampler = _current_sampler.get()
+        if sampler is None:
+            return endpoint(*args, **kwargs)
+        with sampler.attach():
+            return endpoint(*args, **kwargs)
+
+    return wrapper
+
+
+class ProfileStore:
+    def __init__(self, directory: Path, max_files: int = PROFILE_MAX_FILES) -> None:
+        self.directory = directory
+        self.max_files = max_files
+
+    def save(self, method: str, path: str, duration_ms: float, body: str) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-") or "root"
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{method.lower()}-{slug}-{int(duration_ms)}ms{PROFILE_SUFFIX}"
+        target = self.directory / name
+        target.write_text(body)
+        self._prune()
+        return target
+
+    def _files(self) -> List[Path]:
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob(f"*{PROFILE_SUFFIX}"), key=lambda p: p.stat().st_mtime, reverse=True)
+
+    def _prune(self) -> None:
+        for stale in self._files()[self.max_files:]:
+            stale.unlink(missing_ok=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [
+            {"name": p.name, "bytes": p.stat().st_size, "created_at": p.stat().st_mtime}
+            for p in self._files()
+        ]
+
+    def path_for(self, name: str) -> Optional[Path]:
+        # Names come from the URL; only serve files that list() would show.
+        candidate = self.directory / Path(name).name
+        if candidate.suffix != PROFILE_SUFFIX or not candidate.is_file():
+            return None
+        return candidate
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp, store: ProfileStore) -> None:
+        self.app = app
+        self.store = store
+
+    def _wanted(self, scope: Scope) -> bool:
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        if headers.get("x-profile") == "1" and admin_token_ok(headers.get("x-admin-token")):
+            return True
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not PROFILING_ENABLED or scope["type"] != "http" or not self._wanted(scope):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = StackSampler(PROFILE_INTERVAL_MS / 1000)
+        token = _current_sampler.set(sampler)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.stop()
+            _current_sampler.reset(token)
+            duration_ms = (time.perf_counter() - started) * 1000
+            if sampler.samples:
+                saved = self.store.save(scope["method"], scope["path"], duration_ms, sampler.collapsed())
+                print(f"[PROFILE] {scope['method']} {scope['path']} {duration_ms:.0f}ms -> {saved.name}")
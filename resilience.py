@@ -0,0 +1,310 @@
+"""Deadlines, circuit breakers and hedged calls for external providers.
+
+Every outbound call goes through ``call_with_deadline(provider, fn, ...)``:
+
+- the call runs on a shared executor and the caller stops waiting after
+  ``deadline`` seconds (``DeadlineExceeded``); SDK-level timeouts should be
+  set to the same budget so the worker thread is released too
+- each provider has a ``CircuitBreaker``; after ``BREAKER_FAILURE_THRESHOLD``
+  consecutive failures it opens and calls fail fast with ``CircuitOpenError``
+  until ``BREAKER_RESET_SECONDS`` have passed, then one trial call is let
+  through (half-open)
+- ``hedge_after`` (idempotent reads only) starts a second identical attempt
+  if the first has not answered in time and returns whichever finishes first
+
+Both errors subclass ``ProviderUnavailable`` so callers can fall back.
+
+Per-call deadlines do not bound an endpoint that makes several calls in a
+row. ``request_budget(seconds)`` sets a total for the current request;
+every ``call_with_deadline`` inside it waits at most for what is left, and
+fails fast with ``BudgetExhausted`` once nothing is. Timeouts cut short by
+the budget are not counted against the provider's breaker.
+
+``AdmissionController`` is the inbound counterpart: it caps how many
+expensive requests run at once and how many may wait for a slot.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RESILIENCE_MAX_WORKERS", "32")),
+    thread_name_prefix="provider-call",
+)
+
+
+class ProviderUnavailable(Exception):
+    def __init__(self, provider: str, message: str, retry_after: float = 1.0) -> None:
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(ProviderUnavailable):
+    pass
+
+
+class DeadlineExceeded(ProviderUnavailable):
+    pass
+
+
+class BudgetExhausted(ProviderUnavailable):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = BREAKER_RESET_SECONDS,
+        is_failure: Optional[Callable[[BaseException], bool]] = None,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        # Lets callers ignore client errors (bad token, 4xx) that say nothing
+        # about provider health.
+        self.is_failure = is_failure or (lambda exc: True)
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.total_failures = 0
+        self.total_rejections = 0
+        self._trial_in_flight = False
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == "closed":
+                return
+            remaining = self.opened_at + self.reset_seconds - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            self.total_rejections += 1
+        raise CircuitOpenError(self.name, "circuit open", retry_after=max(1.0, remaining))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self, exc: BaseException) -> None:
+        if not isinstance(exc, DeadlineExceeded) and not self.is_failure(exc):
+            self.record_success()
+            return
+        with self._lock:
+            self.total_failures += 1
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def record_abandoned(self) -> None:
+        # The caller gave up for its own reasons; say nothing about health
+        # but let the next half-open trial through.
+        with self._lock:
+            self._trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = 0.0
+            if self.state == "open":
+                retry_in = max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "total_failures": self.total_failures,
+                "total_rejections": self.total_rejections,
+                "retry_in_seconds": round(retry_in, 1),
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str, **kwargs: Any) -> CircuitBreaker:
+    with _breakers_lock:
+        if provider not in _breakers:
+            _breakers[provider] = CircuitBreaker(provider, **kwargs)
+        return _breakers[provider]
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+_budget_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("budget_deadline", default=None)
+
+
+@contextlib.contextmanager
+def request_budget(seconds: float) -> Iterator[None]:
+    """Caps the total time provider calls may take in this context.
+
+    Executors do not copy context; submit work with
+    ``contextvars.copy_context().run`` to keep the budget in other threads.
+    """
+    deadline = time.monotonic() + seconds
+    outer = _budget_deadline.get()
+    token = _budget_deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _budget_deadline.reset(token)
+
+
+def budgeted(seconds: float) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Decorator form of ``request_budget`` for sync endpoint functions."""
+
+    def decorate(fn: Callable[..., T]) -> Callable[..., T]:
+        @wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            with request_budget(seconds):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def remaining_budget() -> Optional[float]:
+    deadline = _budget_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def call_with_deadline(
+    provider: str,
+    fn: Callable[..., T],
+    *args: Any,
+    deadline: float,
+    hedge_after: Optional[float] = None,
+    **kwargs: Any,
+) -> T:
+    budget = remaining_budget()
+    if budget is not None and budget <= 0:
+        raise BudgetExhausted(provider, "request budget exhausted")
+    wait_for = deadline if budget is None else min(deadline, budget)
+
+    breaker = get_breaker(provider)
+    breaker.before_call()
+
+    started = time.monotonic()
+    attempts = [_executor.submit(fn, *args, **kwargs)]
+    if hedge_after and hedge_after < wait_for:
+        done, _ = wait(attempts, timeout=hedge_after)
+        if not done:
+            attempts.append(_executor.submit(fn, *args, **kwargs))
+
+    error: Optional[BaseException] = None
+    pending = set(attempts)
+    while pending:
+        remaining = wait_for - (time.monotonic() - started)
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            exc = future.exception()
+            if exc is None:
+                breaker.record_success()
+                return future.result()
+            error = exc
+
+    if error is not None and not pending:
+        breaker.record_failure(error)
+        raise error
+
+    for future in pending:
+        future.cancel()
+    if wait_for < deadline:
+        breaker.record_abandoned()
+        raise BudgetExhausted(provider, f"request budget ran out after {wait_for:.1f}s")
+    timeout_error = DeadlineExceeded(provider, f"no response within {deadline:g}s")
+    breaker.record_failure(timeout_error)
+    raise timeout_error
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float) -> None:
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded concurrency plus a short, bounded wait queue (asyncio side).
+
+    ``acquire`` admits immediately when a slot is free, otherwise queues for
+    at most ``queue_timeout`` seconds. It raises ``AdmissionRejected`` with
+    reason ``queue_full`` when ``max_queue`` requests are already waiting and
+    ``timeout`` when no slot frees up in time.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: float, retry_after: float) -> None:
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.degraded = 0
+
+    async def acquire(self) -> None:
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self.rejected_queue_full += 1
+                raise AdmissionRejected("queue_full", self.retry_after)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                raise AdmissionRejected("timeout", self.retry_after) from None
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.active += 1
+        self.admitted += 1
+
+    async def release(self) -> None:
+        # Async so Starlette runs it on the event loop when used as a
+        # BackgroundTask; asyncio.Semaphore is not thread-safe.
+        self.active -= 1
+        self._semaphore.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "degraded_text_only": self.degraded,
+        }
@@ -0,0 +1,92 @@
+"""Fast JSON responses for the large list endpoints.
+
+Bodies are serialized with orjson directly (no ``jsonable_encoder`` walk) and
+compressed with brotli or gzip when the client accepts it and the body is
+larger than ``JSON_COMPRESS_MIN_BYTES``. Brotli is used only if the optional
+``brotli`` package is installed.
+
+Top-level values wrapped in ``RawJSON`` are spliced in as already-encoded
+bytes (e.g. ``TransactionBatch.to_json()``), so columnar data never has to
+become Python objects just to be serialized.
+"""
+
+import gzip
+import hashlib
+import os
+from typing import Any, Optional, Set, Tuple
+
+import orjson
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+JSON_COMPRESS_MIN_BYTES = int(os.getenv("JSON_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def accepted_encodings(accept_encoding: str) -> Set[str]:
+    encodings = set()
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        params = params.replace(" ", "")
+        weight = 1.0
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                pass
+        if token and weight > 0:
+            encodings.add(token.strip().lower())
+    return encodings
+
+
+class RawJSON:
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+
+def dumps(content: Any) -> bytes:
+    """orjson.dumps, splicing in ``RawJSON`` values of a top-level dict."""
+    if not isinstance(content, dict) or not any(isinstance(v, RawJSON) for v in content.values()):
+        return orjson.dumps(content)
+    parts = []
+    for key, value in content.items():
+        encoded = value.data if isinstance(value, RawJSON) else orjson.dumps(value)
+        parts.append(orjson.dumps(str(key)) + b":" + encoded)
+    return b"{" + b",".join(parts) + b"}"
+
+
+def encode_json(
+    content: Any,
+    accept_encoding: str = "",
+    min_size: int = JSON_COMPRESS_MIN_BYTES,
+) -> Tuple[bytes, Optional[str]]:
+    """Returns (body, content_encoding); encoding is None when sent as-is."""
+    body = dumps(content)
+    if len(body) < min_size:
+        return body, None
+
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def fast_json_response(request: Request, content: Any) -> Response:
+    body, encoding = encode_json(content, request.headers.get("accept-encoding", ""))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def json_etag(content: Any) -> str:
+    return '"' + hashlib.blake2b(dumps(content), digest_size=12).hexdigest() + '"'
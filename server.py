@@ -1,10 +1,15 @@
+import contextvars
 import io
 import os
 import random
-import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import openai
 
@@ -12,10 +17,12 @@ import plaid
 import stripe
 from dotenv import load_dotenv
 from elevenlabs.client import ElevenLabs
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from plaid.api import plaid_api
 from plaid.model.country_code import CountryCode
@@ -26,12 +33,30 @@ from plaid.model.products import Products
 from plaid.model.transactions_get_request import TransactionsGetRequest
 from plaid.model.transactions_get_request_options import TransactionsGetRequestOptions
 
+from cache import ReadThroughCache
+from resilience import (
+    AdmissionController,
+    AdmissionRejected,
+    ProviderUnavailable,
+    breaker_states,
+    budgeted,
+    call_with_deadline,
+    get_breaker,
+)
+from forecast import forecast_contracts
+from profiling import ProfiledRoute, ProfileStore, ProfilingMiddleware, admin_token_ok
+from responses import RawJSON, fast_json_response, json_etag
+from storage import create_storage
+from transactions import TransactionBatch, TransactionBatchBuilder, to_cents, to_ordinal
+
 load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent
 DATABASE = BASE_DIR / "morkis.db"
 
 app = FastAPI(title="Morkis API")
+# Must be set before any route is declared
+app.router.route_class = ProfiledRoute
 
 _extra_origins = [
     o.strip()
@@ -53,9 +78,59 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Kept outside BASE_DIR, which is served under /static
+profile_store = ProfileStore(Path(os.getenv("PROFILE_DIR", Path(tempfile.gettempdir()) / "morkis-profiles")))
+app.add_middleware(ProfilingMiddleware, store=profile_store)
+
 app.mount("/static", StaticFiles(directory=BASE_DIR), name="static")
 
 
+# =========================
+# External call budgets
+# =========================
+PLAID_DEADLINE = float(os.getenv("PLAID_DEADLINE_SECONDS", "8"))
+PLAID_HEDGE_AFTER = float(os.getenv("PLAID_HEDGE_AFTER_SECONDS", "3"))
+STRIPE_DEADLINE = float(os.getenv("STRIPE_DEADLINE_SECONDS", "10"))
+OPENAI_ROAST_DEADLINE = float(os.getenv("OPENAI_ROAST_DEADLINE_SECONDS", "4"))
+OPENAI_ANALYZE_DEADLINE = float(os.getenv("OPENAI_ANALYZE_DEADLINE_SECONDS", "6"))
+OPENAI_ANALYZE_HEDGE_AFTER = float(os.getenv("OPENAI_ANALYZE_HEDGE_AFTER_SECONDS", "2"))
+ELEVENLABS_DEADLINE = float(os.getenv("ELEVENLABS_DEADLINE_SECONDS", "15"))
+# Total for endpoints that chain several provider calls (Plaid fetch plus a
+# Stripe charge per lost contract, or customer + card setup). Contracts
+# whose charge does not fit stay 'charging' and are retried next pass.
+REQUEST_BUDGET = float(os.getenv("REQUEST_BUDGET_SECONDS", "12"))
+
+# Client errors (bad token, declined card) are not a sign of provider trouble
+get_breaker(
+    "plaid",
+    is_failure=lambda exc: not (isinstance(exc, plaid.ApiException) and exc.status and exc.status < 500),
+)
+get_breaker(
+    "stripe",
+    is_failure=lambda exc: not isinstance(exc, (stripe.error.CardError, stripe.error.InvalidRequestError)),
+)
+stripe.default_http_client = stripe.http_client.new_default_http_client(timeout=STRIPE_DEADLINE)
+
+
+@app.exception_handler(ProviderUnavailable)
+def provider_unavailable(request: Request, exc: ProviderUnavailable) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Upstream unavailable: {exc}"},
+        headers={"Retry-After": str(int(exc.retry_after + 0.5))},
+    )
+
+
+@app.get("/api/health/breakers")
+def health_breakers():
+    return {"breakers": breaker_states()}
+
+
+@app.get("/api/health/admission")
+def health_admission():
+    return {"failure_roast": roast_admission.snapshot(), "roast_prerender": roast_prerenderer.snapshot()}
+
+
 # =========================
 # Request models
 # =========================
@@ -64,6 +139,12 @@ class RoastRequest(BaseModel):
     failed_goal: str = "your goal"
     amount: str = "EUR30"
     anti_charity: str = "your nemesis"
+    # Stream audio back as ElevenLabs synthesizes it (clients play it with MediaSource)
+    stream: bool = False
+    # Roast a stored contract: goal, amount and recipient come from the
+    # contract (only user_name from the request), and a clip pre-rendered
+    # for those inputs is served when there is one
+    contract_id: Optional[int] = None
 
 
 class PlaidLinkTokenRequest(BaseModel):
@@ -89,6 +170,14 @@ class ContractCreateRequest(BaseModel):
     organization_id: Optional[int] = None
     duration_days: int = 30
     payment_method_id: Optional[str] = None
+    # Identifies the payer so their Stripe customer is reused. The card is
+    # only reused when the request carries the same payment_method_id; a
+    # user_id alone never lets a caller charge a saved card.
+    user_id: Optional[str] = None
+
+
+class CardConfirmRequest(BaseModel):
+    setup_intent_id: str
 
 
 class MockTransactionCreateRequest(BaseModel):
@@ -105,121 +194,73 @@ class AnalyzePactRequest(BaseModel):
 # =========================
 # DB helpers
 # =========================
-def get_conn(row_factory: bool = False) -> sqlite3.Connection:
-    conn = sqlite3.connect(DATABASE)
-    if row_factory:
-        conn.row_factory = sqlite3.Row
-    return conn
+store = create_storage(
+    os.getenv("DATABASE_URL"),
+    default_sqlite_path=DATABASE,
+    pool_size=int(os.getenv("DATABASE_POOL_SIZE", "10")),
+)
 
 
 def init_db() -> None:
-    conn = get_conn()
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS plaid_items (
-            user_id TEXT PRIMARY KEY,
-            access_token TEXT NOT NULL,
-            item_id TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
-    )
+    store.init_schema()
 
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS contracts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            category TEXT NOT NULL,
-            spending_limit REAL NOT NULL,
-            bet_amount REAL NOT NULL,
-            anti_charity TEXT NOT NULL,
-            start_date DATE NOT NULL,
-            end_date DATE NOT NULL,
-            status TEXT DEFAULT 'active',
-            payment_method_id TEXT,
-            payment_status TEXT DEFAULT 'pending',
-            stripe_payment_intent_id TEXT,
-            stripe_customer_id TEXT,
-            organization_id INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
-    )
 
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS organizations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT,
-            stripe_account_id TEXT,
-            category TEXT DEFAULT 'other',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
-    )
+# Misses are not cached: a token exchanged on another worker shows up on the
+# next request instead of after the TTL.
+access_token_cache: ReadThroughCache[str, Optional[str]] = ReadThroughCache(
+    store.get_access_token,
+    ttl_seconds=float(os.getenv("ACCESS_TOKEN_CACHE_TTL_SECONDS", "60")),
+    cache_none=False,
+)
 
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS mock_transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            amount REAL NOT NULL,
-            category TEXT NOT NULL,
-            date DATE NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
-    )
 
-    # Backfill columns for older DBs
-    alter_statements = [
-        "ALTER TABLE contracts ADD COLUMN payment_method_id TEXT",
-        "ALTER TABLE contracts ADD COLUMN payment_status TEXT DEFAULT 'pending'",
-        "ALTER TABLE contracts ADD COLUMN stripe_payment_intent_id TEXT",
-        "ALTER TABLE contracts ADD COLUMN stripe_customer_id TEXT",
-        "ALTER TABLE contracts ADD COLUMN organization_id INTEGER",
-    ]
-    for stmt in alter_statements:
-        try:
-            conn.execute(stmt)
-        except sqlite3.OperationalError:
-            pass
+@dataclass(frozen=True)
+class OrganizationsSnapshot:
+    rows: List[Dict[str, Any]]
+    by_id: Dict[int, Dict[str, Any]]
+    etag: str
 
-    conn.commit()
-    conn.close()
+
+def _load_organizations(_: str) -> OrganizationsSnapshot:
+    rows = store.list_organizations()
+    return OrganizationsSnapshot(rows=rows, by_id={row["id"]: row for row in rows}, etag=json_etag(rows))
+
+
+organizations_cache: ReadThroughCache[str, OrganizationsSnapshot] = ReadThroughCache(
+    _load_organizations,
+    ttl_seconds=float(os.getenv("ORGANIZATIONS_CACHE_TTL_SECONDS", "300")),
+)
 
 
 def upsert_plaid_item(user_id: str, access_token: str, item_id: Optional[str]) -> None:
-    conn = get_conn()
-    conn.execute(
-        """
-        INSERT INTO plaid_items (user_id, access_token, item_id)
-        VALUES (?, ?, ?)
-        ON CONFLICT(user_id) DO UPDATE SET
-            access_token = excluded.access_token,
-            item_id = excluded.item_id,
-            updated_at = CURRENT_TIMESTAMP
-        """,
-        (user_id, access_token, item_id),
-    )
-    conn.commit()
-    conn.close()
+    store.upsert_plaid_item(user_id, access_token, item_id)
+    access_token_cache.invalidate(user_id)
+
+
+def delete_plaid_item(user_id: str) -> None:
+    store.delete_plaid_item(user_id)
+    access_token_cache.invalidate(user_id)
 
 
 def get_access_token(user_id: str) -> Optional[str]:
-    conn = get_conn()
-    row = conn.execute("SELECT access_token FROM plaid_items WHERE user_id = ?", (user_id,)).fetchone()
-    conn.close()
-    return row[0] if row else None
+    return access_token_cache.get(user_id)
+
+
+def get_organizations() -> OrganizationsSnapshot:
+    return organizations_cache.get("all")
+
+
+def get_organization(org_id: int) -> Optional[Dict[str, Any]]:
+    return get_organizations().by_id.get(org_id)
+
+
+def insert_organizations(rows: List[Tuple[str, str, Optional[str], str]]) -> None:
+    store.insert_organizations(rows)
+    organizations_cache.clear()
 
 
 def get_mock_transactions() -> List[Dict[str, Any]]:
-    conn = get_conn(row_factory=True)
-    rows = conn.execute("SELECT * FROM mock_transactions ORDER BY date DESC").fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    return store.list_mock_transactions()
 
 
 # =========================
@@ -260,7 +301,7 @@ def get_stripe_secret_key() -> str:
     return secret_key
 
 
-def fetch_plaid_transactions(access_token: str, days: int = 90) -> List[Dict[str, Any]]:
+def fetch_plaid_transactions(access_token: str, days: int = 90) -> TransactionBatch:
     plaid_client = get_plaid_client()
     end_date = date.today()
     start_date = end_date - timedelta(days=max(1, min(days, 365)))
@@ -271,9 +312,16 @@ def fetch_plaid_transactions(access_token: str, days: int = 90) -> List[Dict[str
         end_date=end_date,
         options=TransactionsGetRequestOptions(count=500),
     )
-    response = plaid_client.transactions_get(transactions_request)
+    response = call_with_deadline(
+        "plaid",
+        plaid_client.transactions_get,
+        transactions_request,
+        deadline=PLAID_DEADLINE,
+        hedge_after=PLAID_HEDGE_AFTER,
+        _request_timeout=PLAID_DEADLINE,
+    )
 
-    transactions: List[Dict[str, Any]] = []
+    builder = TransactionBatchBuilder()
     for txn in response.transactions:
         primary_category = "OTHER"
         detailed_category = "OTHER"
@@ -285,28 +333,22 @@ def fetch_plaid_transactions(access_token: str, days: int = 90) -> List[Dict[str
             detailed_category = getattr(pfc, "detailed", primary_category) or primary_category
             confidence = getattr(pfc, "confidence_level", "UNKNOWN") or "UNKNOWN"
 
-        transactions.append(
-            {
-                "id": txn.transaction_id,
-                "name": txn.merchant_name or txn.name,
-                "amount": txn.amount,
-                "date": txn.date.isoformat() if isinstance(txn.date, (date, datetime)) else str(txn.date),
-                "primary_category": primary_category,
-                "detailed_category": detailed_category,
-                "confidence": confidence,
-                "logo_url": getattr(txn, "logo_url", None),
-                "is_mock": False,
-            }
+        builder.append(
+            txn_id=txn.transaction_id,
+            merchant=txn.merchant_name or txn.name,
+            amount_cents=to_cents(txn.amount),
+            day=to_ordinal(txn.date),
+            category=primary_category,
+            detailed=detailed_category,
+            confidence=confidence,
+            logo_url=getattr(txn, "logo_url", None),
         )
 
-    return transactions
+    return builder.build()
 
 
 def seed_demo_organizations() -> None:
-    conn = get_conn()
-    existing = conn.execute("SELECT COUNT(*) FROM organizations").fetchone()[0]
-    if existing > 0:
-        conn.close()
+    if store.count_organizations() > 0:
         return
 
     demo_orgs = [
@@ -321,6 +363,7 @@ def seed_demo_organizations() -> None:
     if stripe_key:
         stripe.api_key = stripe_key
 
+    rows = []
     for name, desc, category in demo_orgs:
         stripe_account_id = None
         if stripe_key:
@@ -341,40 +384,146 @@ def seed_demo_organizations() -> None:
             except stripe.error.StripeError as exc:
                 print(f"[STRIPE CONNECT] Error creating account for {name}: {exc}")
 
-        conn.execute(
-            "INSERT INTO organizations (name, description, stripe_account_id, category) VALUES (?, ?, ?, ?)",
-            (name, desc, stripe_account_id, category),
-        )
+        rows.append((name, desc, stripe_account_id, category))
+
+    insert_organizations(rows)
+
+
+class ContractUnitOfWork:
+    """Collects contract status/payment writes from one evaluation pass.
 
-    conn.commit()
-    conn.close()
+    Writes are buffered in memory and applied with ``executemany`` inside a
+    single transaction on ``flush``, so a batch of transitions costs one
+    commit (one fsync on SQLite) instead of one per contract.
+    """
 
+    def __init__(self) -> None:
+        self.status_updates: List[Tuple[str, int]] = []
+        self.payment_updates: List[Tuple[str, Optional[str], int]] = []
 
-def update_contract_status(contract_dict: Dict[str, Any]) -> Dict[str, Any]:
+    def set_status(self, contract_id: int, status: str) -> None:
+        self.status_updates.append((status, contract_id))
+
+    def set_payment(self, contract_id: int, payment_status: str, payment_intent_id: Optional[str] = None) -> None:
+        self.payment_updates.append((payment_status, payment_intent_id, contract_id))
+
+    def flush(self) -> None:
+        if not self.status_updates and not self.payment_updates:
+            return
+        store.apply_contract_updates(self.status_updates, self.payment_updates)
+        self.status_updates.clear()
+        self.payment_updates.clear()
+
+
+def update_contract_status(contract_dict: Dict[str, Any], uow: ContractUnitOfWork) -> Dict[str, Any]:
     today = date.today()
     contract_end = datetime.fromisoformat(contract_dict["end_date"]).date()
     if contract_dict["status"] == "active" and today > contract_end:
-        conn = get_conn()
-        conn.execute("UPDATE contracts SET status = 'won' WHERE id = ?", (contract_dict["id"],))
-        conn.commit()
-        conn.close()
+        uow.set_status(contract_dict["id"], "won")
+        roast_prerenderer.discard(contract_dict["id"])
         contract_dict["status"] = "won"
     return contract_dict
 
 
-def charge_contract(contract_dict: Dict[str, Any]) -> Dict[str, Any]:
+def charge_idempotency_key(contract_id: int) -> str:
+    # One penalty per contract: retries after a crash or a concurrent
+    # evaluation resolve to the same PaymentIntent instead of a second charge.
+    return f"morkis-contract-{contract_id}-penalty"
+
+
+def setup_payment_method(user_id: Optional[str], payment_method_id: str) -> Tuple[str, Optional[str]]:
+    """Saves a card for off-session charges.
+
+    Returns (customer_id, client_secret). client_secret is set when the card
+    needs authentication (3DS): the client finishes the SetupIntent with
+    stripe.confirmCardSetup and then calls /api/contracts/{id}/confirm-card.
+
+    A known user with the same card needs no Stripe calls at all. Otherwise
+    the user's existing customer is reused (or created once), and a single
+    confirmed SetupIntent attaches the card and authorizes future charges.
+    Idempotency keys make a retried request resolve to the same objects. The
+    user -> card mapping is only stored once the SetupIntent has succeeded.
+    """
+    saved = store.get_stripe_customer(user_id) if user_id else None
+    if saved and saved["payment_method_id"] == payment_method_id:
+        return saved["stripe_customer_id"], None
+
     stripe.api_key = get_stripe_secret_key()
+    if saved:
+        customer_id = saved["stripe_customer_id"]
+    else:
+        customer = call_with_deadline(
+            "stripe",
+            stripe.Customer.create,
+            description="Contract user",
+            metadata={"user_id": user_id} if user_id else {},
+            idempotency_key=f"morkis-customer-{user_id}" if user_id else f"morkis-customer-pm-{payment_method_id}",
+            deadline=STRIPE_DEADLINE,
+        )
+        customer_id = customer.id
+
+    setup_intent = call_with_deadline(
+        "stripe",
+        stripe.SetupIntent.create,
+        customer=customer_id,
+        payment_method=payment_method_id,
+        payment_method_types=["card"],
+        usage="off_session",
+        confirm=True,
+        metadata={"user_id": user_id} if user_id else {},
+        idempotency_key=f"morkis-setup-{customer_id}-{payment_method_id}",
+        deadline=STRIPE_DEADLINE,
+    )
+    if setup_intent.status == "requires_action":
+        return customer_id, setup_intent.client_secret
+    if setup_intent.status != "succeeded":
+        raise HTTPException(status_code=400, detail=f"Payment setup failed: card setup is {setup_intent.status}")
+
+    if user_id:
+        store.upsert_stripe_customer(user_id, customer_id, payment_method_id)
+    return customer_id, None
+
+
+def find_existing_charge(contract_id: int) -> Optional[Any]:
+    """Looks up a PaymentIntent already created for this contract.
+
+    Idempotency keys only live for 24 hours; a contract left 'charging' by a
+    crash may be retried much later, so ask Stripe by metadata first.
+    """
+    result = call_with_deadline(
+        "stripe",
+        stripe.PaymentIntent.search,
+        query=f"metadata['contract_id']:'{contract_id}'",
+        limit=1,
+        deadline=STRIPE_DEADLINE,
+    )
+    return result.data[0] if result.data else None
+
+
+def charge_contract(contract_dict: Dict[str, Any], recovering: bool = False) -> Dict[str, Any]:
+    """Charge a lost contract. Does not write; the caller records the result.
+
+    ``recovering`` marks a contract found in 'charging' from an earlier pass;
+    an existing PaymentIntent for it is reused instead of charging again.
+    """
     amount_cents = int(contract_dict["bet_amount"] * 100)
 
     try:
+        stripe.api_key = get_stripe_secret_key()
+        if recovering:
+            existing = find_existing_charge(contract_dict["id"])
+            if existing is not None:
+                if existing.status in ("succeeded", "processing"):
+                    return {"status": "charged", "payment_intent_id": existing.id}
+                return {
+                    "status": "failed",
+                    "payment_intent_id": existing.id,
+                    "error": f"Earlier payment attempt ended as {existing.status}",
+                }
+
         destination_account = None
         if contract_dict.get("organization_id"):
-            conn = get_conn(row_factory=True)
-            org = conn.execute(
-                "SELECT stripe_account_id FROM organizations WHERE id = ?",
-                (contract_dict["organization_id"],),
-            ).fetchone()
-            conn.close()
+            org = get_organization(contract_dict["organization_id"])
             if org and org["stripe_account_id"]:
                 destination_account = org["stripe_account_id"]
 
@@ -398,23 +547,23 @@ def charge_contract(contract_dict: Dict[str, Any]) -> Dict[str, Any]:
             payment_params["transfer_data"] = {"destination": destination_account}
             payment_params["application_fee_amount"] = application_fee
 
-        payment_intent = stripe.PaymentIntent.create(**payment_params)
-
-        conn = get_conn()
-        conn.execute(
-            "UPDATE contracts SET payment_status = 'charged', stripe_payment_intent_id = ? WHERE id = ?",
-            (payment_intent.id, contract_dict["id"]),
+        payment_intent = call_with_deadline(
+            "stripe",
+            stripe.PaymentIntent.create,
+            **payment_params,
+            idempotency_key=charge_idempotency_key(contract_dict["id"]),
+            deadline=STRIPE_DEADLINE,
         )
-        conn.commit()
-        conn.close()
-
         return {"status": "charged", "payment_intent_id": payment_intent.id}
+    except ProviderUnavailable as exc:
+        # Outcome unknown: stay 'charging' so the next evaluation retries
+        # under the same idempotency key.
+        return {"status": "charging", "error": str(exc)}
     except stripe.error.StripeError as exc:
-        conn = get_conn()
-        conn.execute("UPDATE contracts SET payment_status = 'failed' WHERE id = ?", (contract_dict["id"],))
-        conn.commit()
-        conn.close()
         return {"status": "failed", "error": str(exc)}
+    except HTTPException as exc:
+        # Missing Stripe configuration: nothing was sent, retry next pass
+        return {"status": "charging", "error": exc.detail}
 
 
 # =========================
@@ -432,6 +581,40 @@ _ROAST_STYLES = [
 ]
 
 
+def _roast_messages(style: str, user_name: str, failed_goal: str, amount: str, anti_charity: str) -> List[Dict[str, str]]:
+    return [
+        {
+            "role": "system",
+            "content": (
+                f"You are Morkis, a financial accountability monster. "
+                f"Speak as {style}. "
+                "Generate a spoken roast: EXACTLY 1 sentence, maximum 25 words. "
+                "Be specific and darkly funny. "
+                "You MUST mention: the person's name, what they failed at, "
+                "the euro amount lost, and who receives the money. "
+                "No stage directions, no quotation marks — just the spoken words."
+            ),
+        },
+        {
+            "role": "user",
+            "content": (
+                f"Name: {user_name}\n"
+                f"Failed pact: {failed_goal}\n"
+                f"Amount lost: {amount}\n"
+                f"Money goes to: {anti_charity}"
+            ),
+        },
+    ]
+
+
+def _fallback_roast(user_name: str, failed_goal: str, amount: str, anti_charity: str) -> str:
+    return (
+        f"{user_name}, you failed '{failed_goal}'. "
+        f"Your {amount} now belongs to {anti_charity}. "
+        "Congratulations on funding your enemy."
+    )
+
+
 def generate_roast_script(user_name: str, failed_goal: str, amount: str, anti_charity: str) -> str:
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
@@ -443,43 +626,228 @@ def generate_roast_script(user_name: str, failed_goal: str, amount: str, anti_ch
 
     style = random.choice(_ROAST_STYLES)
     try:
-        client = openai.OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
+        client = openai.OpenAI(api_key=api_key, timeout=OPENAI_ROAST_DEADLINE, max_retries=0)
+        response = call_with_deadline(
+            "openai",
+            client.chat.completions.create,
             model="gpt-4o-mini",
             temperature=1.1,
             max_tokens=50,
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        f"You are Morkis, a financial accountability monster. "
-                        f"Speak as {style}. "
-                        "Generate a spoken roast: EXACTLY 1 sentence, maximum 25 words. "
-                        "Be specific and darkly funny. "
-                        "You MUST mention: the person's name, what they failed at, "
-                        "the euro amount lost, and who receives the money. "
-                        "No stage directions, no quotation marks — just the spoken words."
-                    ),
-                },
-                {
-                    "role": "user",
-                    "content": (
-                        f"Name: {user_name}\n"
-                        f"Failed pact: {failed_goal}\n"
-                        f"Amount lost: {amount}\n"
-                        f"Money goes to: {anti_charity}"
-                    ),
-                },
-            ],
+            messages=_roast_messages(style, user_name, failed_goal, amount, anti_charity),
+            deadline=OPENAI_ROAST_DEADLINE,
         )
         return response.choices[0].message.content.strip()
     except Exception as exc:
         print(f"[OPENAI] Roast generation failed: {exc}")
-        return (
-            f"{user_name}, you failed '{failed_goal}'. "
-            f"Your {amount} now belongs to {anti_charity}. "
-            "Congratulations on funding your enemy."
+        return _fallback_roast(user_name, failed_goal, amount, anti_charity)
+
+
+def stream_roast_script(user_name: str, failed_goal: str, amount: str, anti_charity: str) -> Iterator[str]:
+    """Yields roast text deltas as the model produces them."""
+    if not os.getenv("OPENAI_API_KEY"):
+        yield generate_roast_script(user_name, failed_goal, amount, anti_charity)
+        return
+
+    style = random.choice(_ROAST_STYLES)
+    emitted: List[str] = []
+    try:
+        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=OPENAI_ROAST_DEADLINE, max_retries=0)
+        stream = call_with_deadline(
+            "openai",
+            client.chat.completions.create,
+            model="gpt-4o-mini",
+            temperature=1.1,
+            max_tokens=50,
+            stream=True,
+            messages=_roast_messages(style, user_name, failed_goal, amount, anti_charity),
+            deadline=OPENAI_ROAST_DEADLINE,
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                emitted.append(delta)
+                yield delta
+    except Exception as exc:
+        print(f"[OPENAI] Roast stream failed: {exc}")
+        # Once words have been spoken we cannot swap in the canned line.
+        if not emitted:
+            yield _fallback_roast(user_name, failed_goal, amount, anti_charity)
+            return
+    print(f"[ROAST] {''.join(emitted).strip()}")
+
+
+def elevenlabs_voice() -> Tuple[str, str]:
+    return (
+        os.getenv("ELEVENLABS_VOICE_ID", "ysswSXp8U9dFpzPJqFje"),
+        os.getenv("ELEVENLABS_MODEL_ID", "eleven_multilingual_v2"),
+    )
+
+
+def synthesize_roast_audio(text: str, elevenlabs_key: str) -> bytes:
+    voice_id, model_id = elevenlabs_voice()
+    client = ElevenLabs(api_key=elevenlabs_key, timeout=ELEVENLABS_DEADLINE)
+
+    def convert() -> bytes:
+        audio_stream = client.text_to_speech.convert(
+            text=text,
+            voice_id=voice_id,
+            model_id=model_id,
+            output_format="mp3_44100_128",
         )
+        return b"".join(audio_stream)
+
+    return call_with_deadline("elevenlabs", convert, deadline=ELEVENLABS_DEADLINE)
+
+
+# =========================
+# Roast pre-rendering
+# =========================
+# Contracts at or above this share of their limit get their roast rendered
+# ahead of time; <= 0 disables pre-rendering. Off by default: a render is
+# only served to /api/failure-roast requests that carry the contract_id and
+# the user_name that was passed to /api/contracts/progress.
+ROAST_PRERENDER_THRESHOLD = float(os.getenv("ROAST_PRERENDER_THRESHOLD", "0"))
+ROAST_PRERENDER_TTL_SECONDS = int(os.getenv("ROAST_PRERENDER_TTL_SECONDS", "3600"))
+# Each render is a paid OpenAI + ElevenLabs job; beyond this many queued or
+# running renders new contracts are simply not pre-rendered.
+ROAST_PRERENDER_MAX_PENDING = int(os.getenv("ROAST_PRERENDER_MAX_PENDING", "8"))
+
+
+@dataclass(frozen=True)
+class RoastInputs:
+    user_name: str
+    failed_goal: str
+    amount: str
+    anti_charity: str
+
+    @classmethod
+    def for_contract(cls, contract: Dict[str, Any], user_name: str) -> "RoastInputs":
+        return cls(
+            user_name=user_name,
+            failed_goal=f"keeping {contract['category'].replace('_', ' ').lower()} spending under EUR{contract['spending_limit']:g}",
+            amount=f"EUR{contract['bet_amount']:g}",
+            anti_charity=contract["anti_charity"],
+        )
+
+
+@dataclass
+class PrerenderedRoast:
+    inputs: RoastInputs
+    text: str
+    audio: bytes
+    expires_at: float
+
+
+class RoastPrerenderer:
+    """Background script+audio renders keyed by contract id.
+
+    A render is only served for a roast request with exactly the inputs it
+    was rendered from. Those come from the stored contract plus user_name,
+    so in practice a different user_name (or an edited contract) falls back
+    to the on-demand roast.
+    Renders live in process memory, so with several workers only the worker
+    that evaluated the contract holds the clip.
+    """
+
+    def __init__(self, ttl_seconds: int, max_pending: int, max_workers: int = 2) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="roast-prerender")
+        self._lock = threading.Lock()
+        self._ready: Dict[int, PrerenderedRoast] = {}
+        self._pending: Dict[int, Tuple[RoastInputs, Future]] = {}
+        self.skipped = 0
+
+    def schedule(self, contract: Dict[str, Any], user_name: str) -> None:
+        elevenlabs_key = os.getenv("ELEVENLABS_API_KEY")
+        if ROAST_PRERENDER_THRESHOLD <= 0 or not elevenlabs_key:
+            return
+        contract_id = contract["id"]
+        inputs = RoastInputs.for_contract(contract, user_name)
+        with self._lock:
+            pending = self._pending.get(contract_id)
+            ready = self._ready.get(contract_id)
+            if pending and pending[0] == inputs:
+                return
+            if ready and ready.inputs == inputs and ready.expires_at > time.monotonic():
+                return
+            if len(self._pending) >= self.max_pending:
+                self.skipped += 1
+                return
+            future = self._executor.submit(self._render, contract_id, inputs, elevenlabs_key)
+            self._pending[contract_id] = (inputs, future)
+        if pending is not None:
+            # Inputs changed (e.g. a different user_name); drop the stale render
+            pending[1].cancel()
+        future.add_done_callback(lambda _: self._finish(contract_id, future))
+
+    def _render(self, contract_id: int, inputs: RoastInputs, elevenlabs_key: str) -> PrerenderedRoast:
+        text = generate_roast_script(
+            user_name=inputs.user_name,
+            failed_goal=inputs.failed_goal,
+            amount=inputs.amount,
+            anti_charity=inputs.anti_charity,
+        )
+        audio = synthesize_roast_audio(text, elevenlabs_key)
+        print(f"[ROAST PRERENDER] contract {contract_id}: {text}")
+        return PrerenderedRoast(inputs=inputs, text=text, audio=audio, expires_at=time.monotonic() + self.ttl_seconds)
+
+    def _finish(self, contract_id: int, future: Future) -> None:
+        with self._lock:
+            # A discard() or a newer schedule() while rendering replaced the
+            # entry; don't resurrect this one.
+            pending = self._pending.get(contract_id)
+            if pending is None or pending[1] is not future:
+                return
+            del self._pending[contract_id]
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                print(f"[ROAST PRERENDER] contract {contract_id} failed: {future.exception()}")
+                return
+            self._ready[contract_id] = future.result()
+
+    def get(self, contract_id: int, inputs: RoastInputs, wait_seconds: float = 10.0) -> Optional[PrerenderedRoast]:
+        with self._lock:
+            pending = self._pending.get(contract_id)
+        if pending is not None and pending[0] == inputs:
+            try:
+                # Already in flight: waiting is never slower than starting over.
+                return pending[1].result(timeout=wait_seconds)
+            except Exception:
+                return None
+        with self._lock:
+            render = self._ready.get(contract_id)
+            if render and render.expires_at <= time.monotonic():
+                del self._ready[contract_id]
+                return None
+            if render and render.inputs != inputs:
+                return None
+            return render
+
+    def discard(self, contract_id: int) -> None:
+        with self._lock:
+            self._ready.pop(contract_id, None)
+            pending = self._pending.pop(contract_id, None)
+        if pending is not None:
+            pending[1].cancel()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "ready": len(self._ready),
+                "max_pending": self.max_pending,
+                "skipped_at_capacity": self.skipped,
+            }
+
+
+roast_prerenderer = RoastPrerenderer(
+    ttl_seconds=ROAST_PRERENDER_TTL_SECONDS,
+    max_pending=ROAST_PRERENDER_MAX_PENDING,
+)
 
 
 # =========================
@@ -508,14 +876,70 @@ def app_html() -> FileResponse:
 # =========================
 # ElevenLabs endpoint
 # =========================
+# Each admitted roast holds an OpenAI call plus a full ElevenLabs synthesis;
+# beyond the queue, callers get a text-only roast instead of piling up.
+roast_admission = AdmissionController(
+    "failure-roast",
+    max_concurrent=int(os.getenv("ROAST_MAX_CONCURRENT", "4")),
+    max_queue=int(os.getenv("ROAST_MAX_QUEUE", "8")),
+    queue_timeout=float(os.getenv("ROAST_QUEUE_TIMEOUT_SECONDS", "2")),
+    retry_after=float(os.getenv("ROAST_RETRY_AFTER_SECONDS", "5")),
+)
+ROAST_TEXT_FALLBACK = os.getenv("ROAST_TEXT_FALLBACK", "1").lower() in ("1", "true", "yes")
+
+
 @app.post("/api/failure-roast")
-def failure_roast(payload: RoastRequest):
+async def failure_roast(payload: RoastRequest):
     elevenlabs_key = os.getenv("ELEVENLABS_API_KEY")
     if not elevenlabs_key:
         return JSONResponse(status_code=500, content={"error": "ELEVENLABS_API_KEY is missing in environment"})
 
-    voice_id = os.getenv("ELEVENLABS_VOICE_ID", "ysswSXp8U9dFpzPJqFje")
-    model_id = os.getenv("ELEVENLABS_MODEL_ID", "eleven_multilingual_v2")
+    if payload.contract_id is not None:
+        contract = await run_in_threadpool(store.get_contract, payload.contract_id)
+        if not contract:
+            return JSONResponse(status_code=404, content={"error": "Contract not found"})
+        inputs = RoastInputs.for_contract(contract, payload.user_name)
+        payload = payload.model_copy(
+            update={"failed_goal": inputs.failed_goal, "amount": inputs.amount, "anti_charity": inputs.anti_charity}
+        )
+
+        # Ready clips cost nothing to serve, so they skip admission control
+        render = await run_in_threadpool(roast_prerenderer.get, payload.contract_id, inputs)
+        if render:
+            print(f"[ROAST] (prerendered) {render.text}")
+            return StreamingResponse(
+                io.BytesIO(render.audio),
+                media_type="audio/mpeg",
+                headers={"X-Roast-Prerendered": "1"},
+            )
+
+    try:
+        await roast_admission.acquire()
+    except AdmissionRejected as exc:
+        retry_after = {"Retry-After": str(int(exc.retry_after))}
+        if exc.reason == "queue_full" and ROAST_TEXT_FALLBACK:
+            roast_admission.degraded += 1
+            text = _fallback_roast(payload.user_name, payload.failed_goal, payload.amount, payload.anti_charity)
+            return JSONResponse(
+                content={"text": text, "audio": False},
+                headers={**retry_after, "X-Roast-Mode": "text-only"},
+            )
+        status_code = 429 if exc.reason == "queue_full" else 503
+        return JSONResponse(status_code=status_code, content={"error": "Roast server busy"}, headers=retry_after)
+
+    try:
+        response = await run_in_threadpool(render_failure_roast, payload, elevenlabs_key)
+    except BaseException:
+        await roast_admission.release()
+        raise
+    # Held until the body is fully sent, which matters for streamed roasts
+    response.background = BackgroundTask(roast_admission.release)
+    return response
+
+
+def render_failure_roast(payload: RoastRequest, elevenlabs_key: str) -> StreamingResponse:
+    if payload.stream:
+        return stream_failure_roast(payload, elevenlabs_key)
 
     # Generate a personalized, varied script with OpenAI
     text = generate_roast_script(
@@ -527,18 +951,56 @@ def failure_roast(payload: RoastRequest):
     print(f"[ROAST] {text}")
 
     try:
-        client = ElevenLabs(api_key=elevenlabs_key)
-        audio_stream = client.text_to_speech.convert(
-            text=text,
-            voice_id=voice_id,
+        audio_bytes = synthesize_roast_audio(text, elevenlabs_key)
+        return StreamingResponse(io.BytesIO(audio_bytes), media_type="audio/mpeg")
+    except ProviderUnavailable:
+        raise
+    except Exception as exc:  # pragma: no cover
+        raise HTTPException(status_code=500, detail=f"ElevenLabs request failed: {exc}") from exc
+
+
+def stream_failure_roast(payload: RoastRequest, elevenlabs_key: str):
+    voice_id, model_id = elevenlabs_voice()
+    # Read the whole script here, on the request thread. convert_realtime
+    # pulls text from inside the first next() on its audio stream, so any
+    # delta still pending would be waited for under the ElevenLabs deadline
+    # (and count against its breaker), and the OpenAI request would start
+    # from a provider-pool thread, which can deadlock once the pool is busy.
+    # The script is a single short sentence; the audio still streams back
+    # as it is synthesized.
+    script = "".join(
+        stream_roast_script(
+            user_name=payload.user_name,
+            failed_goal=payload.failed_goal,
+            amount=payload.amount,
+            anti_charity=payload.anti_charity,
+        )
+    )
+    try:
+        client = ElevenLabs(api_key=elevenlabs_key, timeout=ELEVENLABS_DEADLINE)
+        audio_stream = client.text_to_speech.convert_realtime(
+            voice_id,
+            text=iter([script]),
             model_id=model_id,
             output_format="mp3_44100_128",
         )
-        audio_bytes = b"".join(audio_stream)
-        return StreamingResponse(io.BytesIO(audio_bytes), media_type="audio/mpeg")
+        # Pull the first audio frame before committing to a 200 so that
+        # connection/auth errors still surface as a proper error response.
+        first_chunk = call_with_deadline("elevenlabs", next, audio_stream, b"", deadline=ELEVENLABS_DEADLINE)
+    except ProviderUnavailable:
+        raise
     except Exception as exc:  # pragma: no cover
         raise HTTPException(status_code=500, detail=f"ElevenLabs request failed: {exc}") from exc
 
+    def body() -> Iterator[bytes]:
+        yield first_chunk
+        try:
+            yield from audio_stream
+        except Exception as exc:  # pragma: no cover
+            print(f"[ELEVENLABS] Roast stream aborted: {exc}")
+
+    return StreamingResponse(body(), media_type="audio/mpeg")
+
 
 # =========================
 # Pact analysis endpoint
@@ -560,8 +1022,13 @@ def analyze_pact(payload: AnalyzePactRequest):
         }
 
     try:
-        client = openai.OpenAI(api_key=api_key)
-        response = client.chat.completions.create(
+        client = openai.OpenAI(api_key=api_key, timeout=OPENAI_ANALYZE_DEADLINE, max_retries=0)
+        # temperature=0 makes this an idempotent read, so it is safe to hedge
+        response = call_with_deadline(
+            "openai",
+            client.chat.completions.create,
+            deadline=OPENAI_ANALYZE_DEADLINE,
+            hedge_after=OPENAI_ANALYZE_HEDGE_AFTER,
             model="gpt-4o-mini",
             temperature=0,
             max_tokens=200,
@@ -628,7 +1095,13 @@ def create_link_token(payload: PlaidLinkTokenRequest):
             country_codes=country_codes,
             language="en",
         )
-        response = plaid_client.link_token_create(request_data)
+        response = call_with_deadline(
+            "plaid",
+            plaid_client.link_token_create,
+            request_data,
+            deadline=PLAID_DEADLINE,
+            _request_timeout=PLAID_DEADLINE,
+        )
         return {"link_token": response.link_token}
     except plaid.ApiException as exc:
         raise HTTPException(status_code=500, detail=f"Plaid link token failed: {exc}") from exc
@@ -639,7 +1112,14 @@ def exchange_public_token(payload: PlaidExchangeTokenRequest):
     plaid_client = get_plaid_client()
     try:
         exchange_request = ItemPublicTokenExchangeRequest(public_token=payload.public_token)
-        response = plaid_client.item_public_token_exchange(exchange_request)
+        # Not hedged: a public token can only be exchanged once
+        response = call_with_deadline(
+            "plaid",
+            plaid_client.item_public_token_exchange,
+            exchange_request,
+            deadline=PLAID_DEADLINE,
+            _request_timeout=PLAID_DEADLINE,
+        )
         upsert_plaid_item(payload.user_id, response.access_token, response.item_id)
         return {"success": True}
     except plaid.ApiException as exc:
@@ -647,32 +1127,14 @@ def exchange_public_token(payload: PlaidExchangeTokenRequest):
 
 
 @app.get("/api/plaid/transactions")
-def get_transactions(user_id: str, days: int = 90):
+def get_transactions(request: Request, user_id: str, days: int = 90):
     access_token = get_access_token(user_id)
     if not access_token:
         raise HTTPException(status_code=404, detail="No Plaid access token for this user")
 
     try:
-        transactions = fetch_plaid_transactions(access_token, days)
-
-        # Merge mock transactions for test/debug parity with original project
-        for mock in get_mock_transactions():
-            transactions.append(
-                {
-                    "id": f"mock_{mock['id']}",
-                    "name": mock["name"],
-                    "amount": mock["amount"],
-                    "date": mock["date"],
-                    "primary_category": mock["category"],
-                    "detailed_category": mock["category"],
-                    "confidence": "MOCK",
-                    "logo_url": None,
-                    "is_mock": True,
-                }
-            )
-
-        transactions.sort(key=lambda item: item["date"], reverse=True)
-        return {"transactions": transactions}
+        transactions = merge_mock_transactions(fetch_plaid_transactions(access_token, days), get_mock_transactions())
+        return fast_json_response(request, {"transactions": RawJSON(transactions.to_json())})
     except plaid.ApiException as exc:
         raise HTTPException(status_code=500, detail=f"Plaid transactions failed: {exc}") from exc
 
@@ -684,10 +1146,7 @@ def plaid_status(user_id: str):
 
 @app.delete("/api/plaid/disconnect")
 def plaid_disconnect(user_id: str):
-    conn = get_conn()
-    conn.execute("DELETE FROM plaid_items WHERE user_id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+    delete_plaid_item(user_id)
     return {"success": True}
 
 
@@ -711,7 +1170,13 @@ def stripe_status():
 def stripe_setup_intent():
     stripe.api_key = get_stripe_secret_key()
     try:
-        setup_intent = stripe.SetupIntent.create(payment_method_types=["card"], usage="off_session")
+        setup_intent = call_with_deadline(
+            "stripe",
+            stripe.SetupIntent.create,
+            payment_method_types=["card"],
+            usage="off_session",
+            deadline=STRIPE_DEADLINE,
+        )
         return {"client_secret": setup_intent.client_secret}
     except stripe.error.StripeError as exc:
         raise HTTPException(status_code=500, detail=f"Stripe setup intent failed: {exc}") from exc
@@ -725,7 +1190,10 @@ def stripe_test_charge(payload: StripeTestChargeRequest):
         raise HTTPException(status_code=400, detail="Minimum charge is 0.50 EUR")
 
     try:
-        payment_intent = stripe.PaymentIntent.create(
+        payment_intent = call_with_deadline(
+            "stripe",
+            stripe.PaymentIntent.create,
+            deadline=STRIPE_DEADLINE,
             amount=amount_cents,
             currency="eur",
             payment_method=payload.payment_method_id,
@@ -746,34 +1214,31 @@ def stripe_test_charge(payload: StripeTestChargeRequest):
 
 
 @app.get("/api/organizations")
-def organizations():
-    conn = get_conn(row_factory=True)
-    rows = conn.execute("SELECT * FROM organizations ORDER BY name").fetchall()
-    conn.close()
-    return {"organizations": [dict(row) for row in rows]}
+def organizations(request: Request):
+    snapshot = get_organizations()
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == snapshot.etag:
+        return Response(status_code=304, headers=headers)
+    response = fast_json_response(request, {"organizations": snapshot.rows})
+    response.headers.update(headers)
+    return response
 
 
 @app.get("/api/contracts")
-def list_contracts():
-    conn = get_conn(row_factory=True)
-    rows = conn.execute("SELECT * FROM contracts ORDER BY created_at DESC").fetchall()
-    conn.close()
-
-    contracts = []
-    for row in rows:
-        contract = dict(row)
-        contracts.append(update_contract_status(contract))
+def list_contracts(request: Request):
+    uow = ContractUnitOfWork()
+    contracts = [update_contract_status(row, uow) for row in store.list_contracts()]
+    uow.flush()
 
-    return {"contracts": contracts}
+    return fast_json_response(request, {"contracts": contracts})
 
 
 @app.post("/api/contracts")
+@budgeted(REQUEST_BUDGET)
 def create_contract(payload: ContractCreateRequest):
     anti_charity = payload.anti_charity
     if payload.organization_id:
-        conn = get_conn(row_factory=True)
-        org = conn.execute("SELECT name FROM organizations WHERE id = ?", (payload.organization_id,)).fetchone()
-        conn.close()
+        org = get_organization(payload.organization_id)
         if org:
             anti_charity = org["name"]
 
@@ -784,139 +1249,329 @@ def create_contract(payload: ContractCreateRequest):
     end_date = start_date + timedelta(days=int(payload.duration_days))
 
     stripe_customer_id = None
+    client_secret = None
+    payment_method_id = payload.payment_method_id
     payment_status = "no_card"
 
-    if payload.payment_method_id:
-        stripe.api_key = get_stripe_secret_key()
+    if payment_method_id:
         try:
-            customer = stripe.Customer.create(
-                description=f"Contract user - {payload.category}",
-                metadata={"anti_charity": anti_charity},
-            )
-            stripe_customer_id = customer.id
-
-            stripe.PaymentMethod.attach(payload.payment_method_id, customer=stripe_customer_id)
-            stripe.Customer.modify(
-                stripe_customer_id,
-                invoice_settings={"default_payment_method": payload.payment_method_id},
-            )
-            payment_status = "card_saved"
+            stripe_customer_id, client_secret = setup_payment_method(payload.user_id, payment_method_id)
+            # Not charged until the client has completed authentication
+            payment_status = "requires_action" if client_secret else "card_saved"
         except stripe.error.StripeError as exc:
             raise HTTPException(status_code=400, detail=f"Payment setup failed: {exc}") from exc
 
-    conn = get_conn()
-    cursor = conn.execute(
-        """
-        INSERT INTO contracts (
-            category, spending_limit, bet_amount, anti_charity,
-            start_date, end_date, status, payment_method_id,
-            payment_status, stripe_customer_id, organization_id
-        )
-        VALUES (?, ?, ?, ?, ?, ?, 'active', ?, ?, ?, ?)
-        """,
-        (
-            payload.category,
-            float(payload.spending_limit),
-            float(payload.bet_amount),
-            anti_charity,
-            start_date.isoformat(),
-            end_date.isoformat(),
-            payload.payment_method_id,
-            payment_status,
-            stripe_customer_id,
-            payload.organization_id,
-        ),
+    contract_id = store.insert_contract(
+        {
+            "category": payload.category,
+            "spending_limit": float(payload.spending_limit),
+            "bet_amount": float(payload.bet_amount),
+            "anti_charity": anti_charity,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "status": "active",
+            "payment_method_id": payment_method_id,
+            "payment_status": payment_status,
+            "stripe_customer_id": stripe_customer_id,
+            "organization_id": payload.organization_id,
+        }
     )
-    conn.commit()
-    contract_id = cursor.lastrowid
-    conn.close()
 
-    return {"success": True, "contract_id": contract_id, "payment_status": payment_status}
+    response = {"success": True, "contract_id": contract_id, "payment_status": payment_status}
+    if client_secret:
+        response["client_secret"] = client_secret
+    return response
+
+
+@app.post("/api/contracts/{contract_id}/confirm-card")
+def confirm_contract_card(contract_id: int, payload: CardConfirmRequest):
+    """Marks the card saved once the client has authenticated its SetupIntent."""
+    contract = store.get_contract(contract_id)
+    if not contract:
+        raise HTTPException(status_code=404, detail="Contract not found")
+    if contract["payment_status"] != "requires_action":
+        return {"success": True, "payment_status": contract["payment_status"]}
+
+    stripe.api_key = get_stripe_secret_key()
+    try:
+        setup_intent = call_with_deadline(
+            "stripe",
+            stripe.SetupIntent.retrieve,
+            payload.setup_intent_id,
+            deadline=STRIPE_DEADLINE,
+        )
+    except stripe.error.StripeError as exc:
+        raise HTTPException(status_code=400, detail=f"Payment setup failed: {exc}") from exc
+
+    # The SetupIntent must be the one created for this contract's card
+    if setup_intent.customer != contract["stripe_customer_id"] or setup_intent.payment_method != contract["payment_method_id"]:
+        raise HTTPException(status_code=400, detail="Setup intent does not belong to this contract")
+    if setup_intent.status != "succeeded":
+        raise HTTPException(status_code=400, detail=f"Payment setup failed: card setup is {setup_intent.status}")
+
+    # user_id comes from metadata the server set, not from this request
+    user_id = (setup_intent.metadata or {}).get("user_id")
+    if user_id:
+        store.upsert_stripe_customer(user_id, setup_intent.customer, setup_intent.payment_method)
+    store.apply_contract_updates([], [("card_saved", None, contract_id)])
+    return {"success": True, "payment_status": "card_saved"}
 
 
 @app.delete("/api/contracts/{contract_id}")
 def delete_contract(contract_id: int):
-    conn = get_conn()
-    conn.execute("DELETE FROM contracts WHERE id = ?", (contract_id,))
-    conn.commit()
-    conn.close()
+    store.delete_contract(contract_id)
+    roast_prerenderer.discard(contract_id)
     return {"success": True}
 
 
+def merge_mock_transactions(transactions: TransactionBatch, mocks: List[Dict[str, Any]]) -> TransactionBatch:
+    # Merge mock transactions for test/debug parity with original project
+    return TransactionBatch.concat([transactions, TransactionBatch.from_mocks(mocks)]).sorted_newest_first()
+
+
+ChargeQueue = List[Tuple[Dict[str, Any], bool]]
+
+
+def score_contracts(
+    contracts: List[Dict[str, Any]],
+    unsettled: List[Dict[str, Any]],
+    transactions: TransactionBatch,
+    user_name: str,
+) -> Tuple[List[Dict[str, Any]], ChargeQueue]:
+    """Scores active contracts against transactions and records wins/losses.
+
+    Returns the scored contracts and the (contract, recovering) pairs to pass
+    to ``settle_charges``. ``unsettled`` are lost contracts still marked
+    'charging'; they are queued again (reusing any PaymentIntent already
+    created) but not returned. No Stripe calls happen here.
+    """
+    today = date.today()
+    result = []
+    uow = ContractUnitOfWork()
+    to_charge = [(contract, True) for contract in unsettled]
+    # Spend, projection and breach odds for every contract in one numpy pass
+    forecast = forecast_contracts(contracts, transactions, today)
+
+    for index, contract in enumerate(contracts):
+        contract_end = datetime.fromisoformat(contract["end_date"]).date()
+
+        spent = float(forecast.spent[index])
+        contract["spent"] = round(spent, 2)
+        contract["percentage"] = round((spent / contract["spending_limit"]) * 100, 1) if contract["spending_limit"] > 0 else 0
+        contract["days_remaining"] = max(0, (contract_end - today).days)
+        contract["projected_spend"] = round(float(forecast.projected_spend[index]), 2)
+        contract["breach_probability"] = round(float(forecast.breach_probability[index]), 3)
+
+        if forecast.over_limit[index] and contract["status"] == "active":
+            contract["status"] = "lost"
+            uow.set_status(contract["id"], "lost")
+            roast_prerenderer.schedule(contract, user_name)
+
+            if contract.get("payment_method_id") and contract.get("payment_status") == "card_saved":
+                contract["payment_status"] = "charging"
+                uow.set_payment(contract["id"], "charging")
+                to_charge.append((contract, False))
+        elif today > contract_end and contract["status"] == "active":
+            contract["status"] = "won"
+            uow.set_status(contract["id"], "won")
+            roast_prerenderer.discard(contract["id"])
+        elif contract["percentage"] >= ROAST_PRERENDER_THRESHOLD:
+            roast_prerenderer.schedule(contract, user_name)
+
+        result.append(contract)
+
+    # Persist transitions (and the intent to charge) before touching Stripe
+    uow.flush()
+    return result, to_charge
+
+
+def settle_charges(to_charge: ChargeQueue) -> None:
+    """Charges queued contracts and records every outcome in one transaction."""
+    uow = ContractUnitOfWork()
+    try:
+        for contract, recovering in to_charge:
+            try:
+                charge_result = charge_contract(contract, recovering=recovering)
+            except Exception as exc:
+                # Keep 'charging' for the next pass; don't lose the outcomes
+                # already collected for other contracts.
+                charge_result = {"status": "charging", "error": str(exc)}
+            uow.set_payment(contract["id"], charge_result["status"], charge_result.get("payment_intent_id"))
+            contract["payment_status"] = charge_result["status"]
+            contract["charge_error"] = charge_result.get("error")
+    finally:
+        uow.flush()
+
+
+def evaluate_contracts_progress(
+    contracts: List[Dict[str, Any]],
+    unsettled: List[Dict[str, Any]],
+    transactions: TransactionBatch,
+    user_name: str,
+) -> List[Dict[str, Any]]:
+    result, to_charge = score_contracts(contracts, unsettled, transactions, user_name)
+    settle_charges(to_charge)
+    return result
+
+
 @app.get("/api/contracts/progress")
-def contracts_progress(user_id: str, days: int = 90):
+@budgeted(REQUEST_BUDGET)
+def contracts_progress(request: Request, user_id: str, days: int = 90, user_name: str = "friend"):
     access_token = get_access_token(user_id)
     if not access_token:
         raise HTTPException(status_code=404, detail="No Plaid access token for this user")
 
-    conn = get_conn(row_factory=True)
-    contracts = conn.execute("SELECT * FROM contracts WHERE status = 'active'").fetchall()
+    contracts = store.list_contracts_by_status("active")
+    # Charges marked 'charging' whose result was never recorded (e.g. the
+    # process died mid-request). Retrying is safe thanks to the idempotency key.
+    unsettled = store.list_contracts_by_status("lost", payment_status="charging")
 
-    if not contracts:
-        conn.close()
+    if not contracts and not unsettled:
         return {"contracts": []}
 
     try:
-        transactions = fetch_plaid_transactions(access_token, days)
-
-        # Match original behavior: merge mock transactions for local testing
-        for mock in get_mock_transactions():
-            transactions.append(
-                {
-                    "date": mock["date"],
-                    "primary_category": mock["category"],
-                    "amount": mock["amount"],
-                }
-            )
-
-        today = date.today()
-        result = []
-
-        for row in contracts:
-            contract = dict(row)
-            contract_start = datetime.fromisoformat(contract["start_date"]).date()
-            contract_end = datetime.fromisoformat(contract["end_date"]).date()
-
-            spent = 0.0
-            for txn in transactions:
-                txn_date = datetime.fromisoformat(str(txn["date"]).split("T")[0]).date()
-                txn_category = txn.get("primary_category", "OTHER")
-                txn_amount = float(txn.get("amount", 0))
-
-                if (
-                    txn_amount > 0
-                    and txn_category == contract["category"]
-                    and contract_start <= txn_date <= min(contract_end, today)
-                ):
-                    spent += txn_amount
-
-            contract["spent"] = round(spent, 2)
-            contract["percentage"] = round((spent / contract["spending_limit"]) * 100, 1) if contract["spending_limit"] > 0 else 0
-            contract["days_remaining"] = max(0, (contract_end - today).days)
-
-            if spent > contract["spending_limit"] and contract["status"] == "active":
-                contract["status"] = "lost"
-                conn.execute("UPDATE contracts SET status = 'lost' WHERE id = ?", (contract["id"],))
-                conn.commit()
-
-                if contract.get("payment_method_id") and contract.get("payment_status") == "card_saved":
-                    charge_result = charge_contract(contract)
-                    contract["payment_status"] = charge_result["status"]
-                    contract["charge_error"] = charge_result.get("error")
-            elif today > contract_end and contract["status"] == "active":
-                contract["status"] = "won"
-                conn.execute("UPDATE contracts SET status = 'won' WHERE id = ?", (contract["id"],))
-                conn.commit()
-
-            result.append(contract)
-
-        conn.close()
-        return {"contracts": result}
+        transactions = TransactionBatch.empty()
+        if contracts:
+            transactions = merge_mock_transactions(fetch_plaid_transactions(access_token, days), get_mock_transactions())
+        result = evaluate_contracts_progress(contracts, unsettled, transactions, user_name)
+        return fast_json_response(request, {"contracts": result})
     except plaid.ApiException as exc:
-        conn.close()
         raise HTTPException(status_code=500, detail=f"Contract progress failed: {exc}") from exc
 
 
+# =========================
+# Dashboard endpoint
+# =========================
+def reflect_contracts(rows: List[Dict[str, Any]], evaluated: List[Dict[str, Any]]) -> None:
+    settled = {contract["id"]: contract for contract in evaluated}
+    for row in rows:
+        if row["id"] in settled:
+            row["status"] = settled[row["id"]]["status"]
+            row["payment_status"] = settled[row["id"]]["payment_status"]
+
+
+DASHBOARD_SECTIONS = ("plaid_status", "stripe_status", "organizations", "contracts", "progress", "transactions")
+
+# Runs the Plaid fetch while the request thread reads the database
+dashboard_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DASHBOARD_MAX_WORKERS", "8")),
+    thread_name_prefix="dashboard",
+)
+
+
+@app.get("/api/dashboard")
+@budgeted(REQUEST_BUDGET)
+def dashboard(
+    request: Request,
+    user_id: str,
+    days: int = 90,
+    user_name: str = "friend",
+    include: Optional[str] = None,
+):
+    sections = set(DASHBOARD_SECTIONS)
+    if include:
+        sections = {name.strip() for name in include.split(",") if name.strip()}
+        unknown = sections - set(DASHBOARD_SECTIONS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown dashboard sections: {', '.join(sorted(unknown))}")
+
+    access_token = get_access_token(user_id)
+    needs_transactions = bool(access_token) and bool(sections & {"progress", "transactions"})
+    plaid_future = (
+        # copy_context keeps the request budget in the worker thread
+        dashboard_executor.submit(contextvars.copy_context().run, fetch_plaid_transactions, access_token, days)
+        if needs_transactions
+        else None
+    )
+
+    result: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+
+    if "plaid_status" in sections:
+        result["plaid_status"] = {"user_id": user_id, "has_access_token": bool(access_token)}
+    if "stripe_status" in sections:
+        result["stripe_status"] = stripe_status()
+    if "organizations" in sections:
+        result["organizations"] = get_organizations().rows
+
+    # Wait for Plaid before checking out a connection, so a slow fetch does
+    # not pin one from the pool.
+    plaid_batch: Optional[TransactionBatch] = None
+    if plaid_future is not None:
+        try:
+            plaid_batch = plaid_future.result()
+        except HTTPException as exc:
+            errors["transactions"] = f"Plaid transactions failed: {exc.detail}"
+        except Exception as exc:
+            errors["transactions"] = f"Plaid transactions failed: {exc}"
+
+    to_charge: ChargeQueue = []
+    with store.session():
+        all_contracts = store.list_contracts() if sections & {"contracts", "progress"} else []
+        transactions = TransactionBatch.empty()
+        if plaid_batch is not None:
+            transactions = merge_mock_transactions(plaid_batch, get_mock_transactions())
+
+        if "progress" in sections:
+            if not access_token:
+                errors["progress"] = "No Plaid access token for this user"
+            elif plaid_batch is None:
+                errors["progress"] = errors["transactions"]
+            else:
+                active = [dict(row) for row in all_contracts if row["status"] == "active"]
+                unsettled = [
+                    dict(row)
+                    for row in all_contracts
+                    if row["status"] == "lost" and row["payment_status"] == "charging"
+                ]
+                result["progress"], to_charge = score_contracts(active, unsettled, transactions, user_name)
+                # Reflect transitions before the contracts section settles
+                # its own, so a lost contract is not also marked won.
+                reflect_contracts(all_contracts, result["progress"])
+
+        if "contracts" in sections:
+            uow = ContractUnitOfWork()
+            result["contracts"] = [update_contract_status(row, uow) for row in all_contracts]
+            uow.flush()
+
+    # Stripe calls run after the connection went back to the pool
+    if to_charge:
+        settle_charges(to_charge)
+        reflect_contracts(all_contracts, [contract for contract, _ in to_charge])
+
+    if "transactions" in sections and plaid_batch is not None:
+        result["transactions"] = RawJSON(transactions.to_json())
+    elif "transactions" in sections and not access_token:
+        errors["transactions"] = "No Plaid access token for this user"
+
+    if errors:
+        result["errors"] = {name: message for name, message in errors.items() if name in sections}
+    return fast_json_response(request, result)
+
+
+# =========================
+# Admin endpoints
+# =========================
+def require_admin(token: Optional[str]) -> None:
+    if not admin_token_ok(token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@app.get("/api/admin/profiles")
+def list_profiles(x_admin_token: Optional[str] = Header(default=None)):
+    require_admin(x_admin_token)
+    return {"profiles": profile_store.list()}
+
+
+@app.get("/api/admin/profiles/{name}")
+def download_profile(name: str, x_admin_token: Optional[str] = Header(default=None)):
+    require_admin(x_admin_token)
+    path = profile_store.path_for(name)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=path.name)
+
+
 # =========================
 # Mock transaction endpoints
 # =========================
@@ -928,38 +1583,26 @@ def list_mock_transactions():
 @app.post("/api/mock-transactions")
 def create_mock_transaction(payload: MockTransactionCreateRequest):
     txn_date = payload.date or date.today().isoformat()
-    conn = get_conn()
-    cursor = conn.execute(
-        "INSERT INTO mock_transactions (name, amount, category, date) VALUES (?, ?, ?, ?)",
-        (payload.name, float(payload.amount), payload.category, txn_date),
-    )
-    conn.commit()
-    txn_id = cursor.lastrowid
-    conn.close()
+    txn_id = store.insert_mock_transaction(payload.name, float(payload.amount), payload.category, txn_date)
     return {"success": True, "transaction_id": txn_id}
 
 
 @app.delete("/api/mock-transactions/{txn_id}")
 def delete_mock_transaction(txn_id: int):
-    conn = get_conn()
-    conn.execute("DELETE FROM mock_transactions WHERE id = ?", (txn_id,))
-    conn.commit()
-    conn.close()
+    store.delete_mock_transaction(txn_id)
     return {"success": True}
 
 
 @app.delete("/api/mock-transactions/clear")
 def clear_mock_transactions():
-    conn = get_conn()
-    conn.execute("DELETE FROM mock_transactions")
-    conn.commit()
-    conn.close()
+    store.clear_mock_transactions()
     return {"success": True}
 
 
 # Initialize once at startup
-init_db()
-seed_demo_organizations()
+with store.startup_lock():
+    init_db()
+    seed_demo_organizations()
 
 
 if __name__ == "__main__":
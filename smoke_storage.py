@@ -0,0 +1,99 @@
+"""Smoke test for a storage backend against a real database.
+
+Runs every repository method once against ``DATABASE_URL`` (use a scratch
+database; rows it creates are removed again). Schema creation is started
+from several threads at once, the way several workers boot against a
+fresh database.
+
+    DATABASE_URL=postgresql://localhost/morkis_scratch python smoke_storage.py
+"""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+from storage import create_storage
+
+WORKERS = 4
+
+
+def boot(database_url: str) -> None:
+    store = create_storage(database_url, Path("unused.db"), pool_size=2)
+    try:
+        with store.startup_lock():
+            store.init_schema()
+    finally:
+        store.close()
+
+
+def main() -> None:
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("DATABASE_URL is not set; skipping")
+        sys.exit(0)
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        for future in [pool.submit(boot, database_url) for _ in range(WORKERS)]:
+            future.result()
+    print(f"init_schema from {WORKERS} workers: ok")
+
+    store = create_storage(database_url, Path("unused.db"))
+    user_id = "smoke-storage-user"
+    today = date.today().isoformat()
+    try:
+        store.upsert_plaid_item(user_id, "access-1", "item-1")
+        store.upsert_plaid_item(user_id, "access-2", "item-1")
+        assert store.get_access_token(user_id) == "access-2"
+
+        store.upsert_stripe_customer(user_id, "cus_smoke", "pm_1")
+        store.upsert_stripe_customer(user_id, "cus_smoke", "pm_2")
+        assert store.get_stripe_customer(user_id)["payment_method_id"] == "pm_2"
+
+        store.insert_organizations([("Smoke Org", "smoke", None, "smoke")])
+        org = next(o for o in store.list_organizations() if o["name"] == "Smoke Org")
+        assert store.get_organization(org["id"])["name"] == "Smoke Org"
+        assert store.count_organizations() >= 1
+
+        contract_id = store.insert_contract(
+            {
+                "category": "FOOD_AND_DRINK",
+                "spending_limit": 50.0,
+                "bet_amount": 5.0,
+                "anti_charity": "Smoke Org",
+                "start_date": today,
+                "end_date": today,
+                "status": "active",
+                "payment_method_id": "pm_2",
+                "payment_status": "card_saved",
+                "stripe_customer_id": "cus_smoke",
+                "organization_id": org["id"],
+            }
+        )
+        assert store.get_contract(contract_id)["payment_method_id"] == "pm_2"
+        with store.session():
+            store.apply_contract_updates([("lost", contract_id)], [("charging", None, contract_id)])
+            charging = store.list_contracts_by_status("lost", payment_status="charging")
+            assert any(c["id"] == contract_id for c in charging)
+            store.apply_contract_updates([], [("charged", "pi_smoke", contract_id)])
+            contract = next(c for c in store.list_contracts() if c["id"] == contract_id)
+            assert contract["stripe_payment_intent_id"] == "pi_smoke"
+            assert isinstance(contract["start_date"], str)
+
+        txn_id = store.insert_mock_transaction("Smoke", 1.5, "FOOD_AND_DRINK", today)
+        assert any(t["id"] == txn_id for t in store.list_mock_transactions())
+        store.delete_mock_transaction(txn_id)
+        assert all(t["id"] != txn_id for t in store.list_mock_transactions())
+    finally:
+        store.delete_plaid_item(user_id)
+        store._execute("DELETE FROM stripe_customers WHERE user_id = ?", (user_id,))
+        store._execute("DELETE FROM contracts WHERE anti_charity = ?", ("Smoke Org",))
+        store._execute("DELETE FROM organizations WHERE name = ?", ("Smoke Org",))
+        store.close()
+
+    print(f"{type(store).__name__}: all repository methods ok")
+
+
+if __name__ == "__main__":
+    main()
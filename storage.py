@@ -0,0 +1,502 @@
+"""Persistence layer for Morkis.
+
+``create_storage`` picks a backend from ``DATABASE_URL``:
+
+- unset / ``sqlite:///path``  -> ``SQLiteStorage`` (single file, local dev)
+- ``postgres://`` / ``postgresql://`` -> ``PostgresStorage`` (pooled, safe to
+  share between many uvicorn/gunicorn workers or containers)
+
+Both backends return plain dicts with dates as ISO strings so the rest of the
+app does not care which one is active.
+"""
+
+import contextlib
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+Row = Dict[str, Any]
+StatusUpdate = Tuple[str, int]
+PaymentUpdate = Tuple[str, Optional[str], int]
+
+
+def _normalize(row: Row) -> Row:
+    return {
+        key: value.isoformat() if isinstance(value, (date, datetime)) else value
+        for key, value in row.items()
+    }
+
+
+class Storage(ABC):
+    """Repository for plaid_items, stripe_customers, contracts, organizations and mock_transactions.
+
+    Queries are written once with ``?`` placeholders; backends only provide
+    the connection primitives below.
+    """
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+
+    @abstractmethod
+    def init_schema(self) -> None:
+        """Creates missing tables; run under ``startup_lock``."""
+
+    @contextlib.contextmanager
+    def session(self) -> Iterator[None]:
+        """Pins one connection to the current thread for a group of calls.
+
+        Writes inside a session still commit individually; the point is to
+        avoid a connect/checkout per query on read-heavy requests.
+        """
+        if getattr(self._local, "conn", None) is not None:
+            yield
+            return
+        with self._open() as conn:
+            self._local.conn = conn
+            try:
+                yield
+            finally:
+                self._local.conn = None
+
+    @contextlib.contextmanager
+    def _connection(self) -> Iterator[Any]:
+        pinned = getattr(self._local, "conn", None)
+        if pinned is not None:
+            yield pinned
+        else:
+            with self._open() as conn:
+                yield conn
+
+    @contextlib.contextmanager
+    def startup_lock(self) -> Iterator[None]:
+        """Serializes one-off startup work (schema, seeding) across workers."""
+        yield
+
+    def close(self) -> None:
+        pass
+
+    # --- backend primitives ---
+    @abstractmethod
+    def _open(self) -> "contextlib.AbstractContextManager[Any]":
+        ...
+
+    @abstractmethod
+    def _fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[Row]:
+        ...
+
+    @abstractmethod
+    def _execute(self, sql: str, params: Sequence[Any] = ()) -> None:
+        ...
+
+    @abstractmethod
+    def _insert(self, sql: str, params: Sequence[Any]) -> int:
+        ...
+
+    @abstractmethod
+    def _execute_batch(self, statements: Sequence[Tuple[str, Sequence[Sequence[Any]]]]) -> None:
+        """Runs every (sql, rows) pair with executemany in one transaction."""
+
+    def _fetchone(self, sql: str, params: Sequence[Any] = ()) -> Optional[Row]:
+        rows = self._fetchall(sql, params)
+        return rows[0] if rows else None
+
+    # --- plaid_items ---
+    def upsert_plaid_item(self, user_id: str, access_token: str, item_id: Optional[str]) -> None:
+        self._execute(
+            """
+            INSERT INTO plaid_items (user_id, access_token, item_id)
+            VALUES (?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                access_token = excluded.access_token,
+                item_id = excluded.item_id,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            (user_id, access_token, item_id),
+        )
+
+    def get_access_token(self, user_id: str) -> Optional[str]:
+        row = self._fetchone("SELECT access_token FROM plaid_items WHERE user_id = ?", (user_id,))
+        return row["access_token"] if row else None
+
+    def delete_plaid_item(self, user_id: str) -> None:
+        self._execute("DELETE FROM plaid_items WHERE user_id = ?", (user_id,))
+
+    # --- stripe_customers ---
+    def get_stripe_customer(self, user_id: str) -> Optional[Row]:
+        return self._fetchone(
+            "SELECT user_id, stripe_customer_id, payment_method_id FROM stripe_customers WHERE user_id = ?",
+            (user_id,),
+        )
+
+    def upsert_stripe_customer(self, user_id: str, stripe_customer_id: str, payment_method_id: str) -> None:
+        self._execute(
+            """
+            INSERT INTO stripe_customers (user_id, stripe_customer_id, payment_method_id)
+            VALUES (?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                stripe_customer_id = excluded.stripe_customer_id,
+                payment_method_id = excluded.payment_method_id,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            (user_id, stripe_customer_id, payment_method_id),
+        )
+
+    # --- organizations ---
+    def list_organizations(self) -> List[Row]:
+        return self._fetchall("SELECT * FROM organizations ORDER BY name")
+
+    def get_organization(self, org_id: int) -> Optional[Row]:
+        return self._fetchone("SELECT * FROM organizations WHERE id = ?", (org_id,))
+
+    def count_organizations(self) -> int:
+        row = self._fetchone("SELECT COUNT(*) AS n FROM organizations")
+        return int(row["n"]) if row else 0
+
+    def insert_organizations(self, orgs: Sequence[Tuple[str, str, Optional[str], str]]) -> None:
+        self._execute_batch(
+            [
+                (
+                    "INSERT INTO organizations (name, description, stripe_account_id, category) VALUES (?, ?, ?, ?)",
+                    orgs,
+                )
+            ]
+        )
+
+    # --- contracts ---
+    def list_contracts(self) -> List[Row]:
+        return self._fetchall("SELECT * FROM contracts ORDER BY created_at DESC")
+
+    def get_contract(self, contract_id: int) -> Optional[Row]:
+        return self._fetchone("SELECT * FROM contracts WHERE id = ?", (contract_id,))
+
+    def list_contracts_by_status(self, status: str, payment_status: Optional[str] = None) -> List[Row]:
+        if payment_status is None:
+            return self._fetchall("SELECT * FROM contracts WHERE status = ?", (status,))
+        return self._fetchall(
+            "SELECT * FROM contracts WHERE status = ? AND payment_status = ?",
+            (status, payment_status),
+        )
+
+    def insert_contract(self, fields: Row) -> int:
+        columns = list(fields)
+        return self._insert(
+            f"INSERT INTO contracts ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+            [fields[c] for c in columns],
+        )
+
+    def delete_contract(self, contract_id: int) -> None:
+        self._execute("DELETE FROM contracts WHERE id = ?", (contract_id,))
+
+    def apply_contract_updates(
+        self,
+        status_updates: Sequence[StatusUpdate],
+        payment_updates: Sequence[PaymentUpdate],
+    ) -> None:
+        statements: List[Tuple[str, Sequence[Sequence[Any]]]] = []
+        if status_updates:
+            statements.append(("UPDATE contracts SET status = ? WHERE id = ?", status_updates))
+        if payment_updates:
+            statements.append(
+                (
+                    """
+                    UPDATE contracts
+                    SET payment_status = ?,
+                        stripe_payment_intent_id = COALESCE(?, stripe_payment_intent_id)
+                    WHERE id = ?
+                    """,
+                    payment_updates,
+                )
+            )
+        if statements:
+            self._execute_batch(statements)
+
+    # --- mock_transactions ---
+    def list_mock_transactions(self) -> List[Row]:
+        return self._fetchall("SELECT * FROM mock_transactions ORDER BY date DESC")
+
+    def insert_mock_transaction(self, name: str, amount: float, category: str, txn_date: str) -> int:
+        return self._insert(
+            "INSERT INTO mock_transactions (name, amount, category, date) VALUES (?, ?, ?, ?)",
+            (name, amount, category, txn_date),
+        )
+
+    def delete_mock_transaction(self, txn_id: int) -> None:
+        self._execute("DELETE FROM mock_transactions WHERE id = ?", (txn_id,))
+
+    def clear_mock_transactions(self) -> None:
+        self._execute("DELETE FROM mock_transactions")
+
+
+# =========================
+# SQLite
+# =========================
+class SQLiteStorage(Storage):
+    def __init__(self, path: Path) -> None:
+        super().__init__()
+        self.path = path
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextlib.contextmanager
+    def _open(self) -> Iterator[sqlite3.Connection]:
+        conn = self.connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def init_schema(self) -> None:
+        conn = self.connect()
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS plaid_items (
+                user_id TEXT PRIMARY KEY,
+                access_token TEXT NOT NULL,
+                item_id TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS stripe_customers (
+                user_id TEXT PRIMARY KEY,
+                stripe_customer_id TEXT NOT NULL,
+                payment_method_id TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS contracts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                category TEXT NOT NULL,
+                spending_limit REAL NOT NULL,
+                bet_amount REAL NOT NULL,
+                anti_charity TEXT NOT NULL,
+                start_date DATE NOT NULL,
+                end_date DATE NOT NULL,
+                status TEXT DEFAULT 'active',
+                payment_method_id TEXT,
+                payment_status TEXT DEFAULT 'pending',
+                stripe_payment_intent_id TEXT,
+                stripe_customer_id TEXT,
+                organization_id INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS organizations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                description TEXT,
+                stripe_account_id TEXT,
+                category TEXT DEFAULT 'other',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS mock_transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                amount REAL NOT NULL,
+                category TEXT NOT NULL,
+                date DATE NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+            """
+        )
+
+        # Backfill columns for older DBs
+        alter_statements = [
+            "ALTER TABLE contracts ADD COLUMN payment_method_id TEXT",
+            "ALTER TABLE contracts ADD COLUMN payment_status TEXT DEFAULT 'pending'",
+            "ALTER TABLE contracts ADD COLUMN stripe_payment_intent_id TEXT",
+            "ALTER TABLE contracts ADD COLUMN stripe_customer_id TEXT",
+            "ALTER TABLE contracts ADD COLUMN organization_id INTEGER",
+        ]
+        for stmt in alter_statements:
+            try:
+                conn.execute(stmt)
+            except sqlite3.OperationalError:
+                pass
+
+        conn.commit()
+        conn.close()
+
+    def _fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[Row]:
+        with self._connection() as conn:
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+    def _execute(self, sql: str, params: Sequence[Any] = ()) -> None:
+        with self._connection() as conn, conn:
+            conn.execute(sql, params)
+
+    def _insert(self, sql: str, params: Sequence[Any]) -> int:
+        with self._connection() as conn, conn:
+            return int(conn.execute(sql, params).lastrowid)
+
+    def _execute_batch(self, statements: Sequence[Tuple[str, Sequence[Sequence[Any]]]]) -> None:
+        with self._connection() as conn, conn:
+            for sql, rows in statements:
+                conn.executemany(sql, rows)
+
+
+# =========================
+# PostgreSQL
+# =========================
+# Fixed key for pg_advisory_lock so only one worker creates the schema and
+# seeds at startup; concurrent CREATE TABLE IF NOT EXISTS can still collide
+# on pg_type.
+_STARTUP_LOCK_KEY = 0x6D6F726B  # "mork"
+
+
+class PostgresStorage(Storage):
+    """PostgreSQL backend on a psycopg 3 connection pool.
+
+    Request handlers are sync and run in FastAPI's threadpool, so this uses
+    the thread-safe ``psycopg_pool.ConnectionPool``; each call borrows a
+    connection for one statement or batch, or for a whole ``session()``.
+    Connections are in autocommit mode and writes open explicit
+    transactions, so reads in a session never hold a transaction open.
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = 10) -> None:
+        try:
+            from psycopg.rows import dict_row
+            from psycopg_pool import ConnectionPool
+        except ImportError as exc:  # pragma: no cover
+            raise RuntimeError(
+                "PostgreSQL storage requires 'psycopg[binary]' and 'psycopg-pool'"
+            ) from exc
+
+        super().__init__()
+        self.pool = ConnectionPool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            kwargs={"row_factory": dict_row, "autocommit": True},
+            open=True,
+        )
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def _open(self) -> "contextlib.AbstractContextManager[Any]":
+        return self.pool.connection()
+
+    @staticmethod
+    def _sql(sql: str) -> str:
+        # Queries never contain literal '?' or '%', so a plain swap is enough.
+        return sql.replace("?", "%s")
+
+    def init_schema(self) -> None:
+        with self.pool.connection() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS plaid_items (
+                    user_id TEXT PRIMARY KEY,
+                    access_token TEXT NOT NULL,
+                    item_id TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS stripe_customers (
+                    user_id TEXT PRIMARY KEY,
+                    stripe_customer_id TEXT NOT NULL,
+                    payment_method_id TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS contracts (
+                    id BIGSERIAL PRIMARY KEY,
+                    category TEXT NOT NULL,
+                    spending_limit DOUBLE PRECISION NOT NULL,
+                    bet_amount DOUBLE PRECISION NOT NULL,
+                    anti_charity TEXT NOT NULL,
+                    start_date DATE NOT NULL,
+                    end_date DATE NOT NULL,
+                    status TEXT DEFAULT 'active',
+                    payment_method_id TEXT,
+                    payment_status TEXT DEFAULT 'pending',
+                    stripe_payment_intent_id TEXT,
+                    stripe_customer_id TEXT,
+                    organization_id BIGINT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS contracts_status_idx ON contracts (status)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS organizations (
+                    id BIGSERIAL PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    description TEXT,
+                    stripe_account_id TEXT,
+                    category TEXT DEFAULT 'other',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS mock_transactions (
+                    id BIGSERIAL PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    amount DOUBLE PRECISION NOT NULL,
+                    category TEXT NOT NULL,
+                    date DATE NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+
+    @contextlib.contextmanager
+    def startup_lock(self) -> Iterator[None]:
+        with self.pool.connection() as conn:
+            conn.execute("SELECT pg_advisory_lock(%s)", (_STARTUP_LOCK_KEY,))
+            try:
+                yield
+            finally:
+                conn.execute("SELECT pg_advisory_unlock(%s)", (_STARTUP_LOCK_KEY,))
+
+    def _fetchall(self, sql: str, params: Sequence[Any] = ()) -> List[Row]:
+        with self._connection() as conn:
+            return [_normalize(row) for row in conn.execute(self._sql(sql), params).fetchall()]
+
+    def _execute(self, sql: str, params: Sequence[Any] = ()) -> None:
+        with self._connection() as conn, conn.transaction():
+            conn.execute(self._sql(sql), params)
+
+    def _insert(self, sql: str, params: Sequence[Any]) -> int:
+        with self._connection() as conn, conn.transaction():
+            row = conn.execute(self._sql(sql) + " RETURNING id", params).fetchone()
+            return int(row["id"])
+
+    def _execute_batch(self, statements: Sequence[Tuple[str, Sequence[Sequence[Any]]]]) -> None:
+        with self._connection() as conn, conn.transaction(), conn.cursor() as cursor:
+            for sql, rows in statements:
+                cursor.executemany(self._sql(sql), rows)
+
+
+# =========================
+# Factory
+# =========================
+def create_storage(database_url: Optional[str], default_sqlite_path: Path, pool_size: int = 10) -> Storage:
+    if not database_url:
+        return SQLiteStorage(default_sqlite_path)
+    if database_url.startswith(("postgres://", "postgresql://")):
+        return PostgresStorage(database_url, max_size=pool_size)
+    if database_url.startswith("sqlite:///"):
+        return SQLiteStorage(Path(database_url[len("sqlite:///"):]))
+    raise RuntimeError(f"Unsupported DATABASE_URL scheme: {database_url.split(':', 1)[0]}")
@@ -0,0 +1,286 @@
+"""Columnar in-memory transaction batches.
+
+A ``TransactionBatch`` keeps transactions as parallel numpy arrays instead of
+one dict per row:
+
+- amounts as int64 cents, so sums are exact
+- dates as int32 day ordinals
+- merchant, categories, confidence and logo URL as int32 codes into one
+  interned ``strings`` table (-1 for missing)
+- ids as a fixed-width bytes array, already JSON-escaped (UTF-8)
+
+That is roughly 60-80 bytes per row against ~1 KB for the dict form. Batches
+are built once per fetch, scanned directly by progress evaluation and
+serialized straight from the columns (``to_json``); ``to_dicts`` is only for
+tooling.
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import orjson
+
+_CODE_COLUMNS = ("merchant", "category", "detailed", "confidence", "logo")
+
+
+def to_cents(amount: Any) -> int:
+    return int(round(float(amount) * 100))
+
+
+def to_ordinal(value: Any) -> int:
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(str(value)[:10]).toordinal()
+
+
+def _combined_codes(columns: List[np.ndarray]) -> np.ndarray:
+    """Dense codes (0..k-1) for the distinct rows of non-negative int columns."""
+    key = np.zeros(len(columns[0]), dtype=np.int64)
+    radix_product = 1
+    for values in columns:
+        radix = int(values.max()) + 1
+        if radix_product * radix >= 2**62:
+            # Re-densify so the mixed-radix key cannot overflow
+            _, key = np.unique(key, return_inverse=True)
+            radix_product = int(key.max()) + 1
+        key = key.ravel() * radix + values
+        radix_product *= radix
+    _, codes = np.unique(key, return_inverse=True)
+    return codes.ravel()
+
+
+class TransactionBatchBuilder:
+    def __init__(self) -> None:
+        self.strings: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self._ids: List[bytes] = []
+        self._cents: List[int] = []
+        self._days: List[int] = []
+        self._is_mock: List[bool] = []
+        self._columns: Dict[str, List[int]] = {name: [] for name in _CODE_COLUMNS}
+
+    def _intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+    def append(
+        self,
+        txn_id: str,
+        merchant: Optional[str],
+        amount_cents: int,
+        day: int,
+        category: str,
+        detailed: str,
+        confidence: str,
+        logo_url: Optional[str] = None,
+        is_mock: bool = False,
+    ) -> None:
+        # Escaped once here so to_json can splice ids in verbatim
+        self._ids.append(orjson.dumps(txn_id)[1:-1])
+        self._cents.append(amount_cents)
+        self._days.append(day)
+        self._is_mock.append(is_mock)
+        columns = self._columns
+        columns["merchant"].append(self._intern(merchant))
+        columns["category"].append(self._intern(category))
+        columns["detailed"].append(self._intern(detailed))
+        columns["confidence"].append(self._intern(confidence))
+        columns["logo"].append(self._intern(logo_url))
+
+    def build(self) -> "TransactionBatch":
+        return TransactionBatch(
+            ids=np.array(self._ids, dtype=bytes) if self._ids else np.zeros(0, dtype="S1"),
+            cents=np.array(self._cents, dtype=np.int64),
+            days=np.array(self._days, dtype=np.int32),
+            is_mock=np.array(self._is_mock, dtype=bool),
+            strings=list(self.strings),
+            **{name: np.array(values, dtype=np.int32) for name, values in self._columns.items()},
+        )
+
+
+@dataclass
+class TransactionBatch:
+    ids: np.ndarray
+    cents: np.ndarray
+    days: np.ndarray
+    is_mock: np.ndarray
+    strings: List[str]
+    merchant: np.ndarray
+    category: np.ndarray
+    detailed: np.ndarray
+    confidence: np.ndarray
+    logo: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.cents)
+
+    @classmethod
+    def empty(cls) -> "TransactionBatch":
+        return TransactionBatchBuilder().build()
+
+    @classmethod
+    def from_mocks(cls, mocks: Iterable[Dict[str, Any]]) -> "TransactionBatch":
+        builder = TransactionBatchBuilder()
+        for mock in mocks:
+            builder.append(
+                txn_id=f"mock_{mock['id']}",
+                merchant=mock["name"],
+                amount_cents=to_cents(mock["amount"]),
+                day=to_ordinal(mock["date"]),
+                category=mock["category"],
+                detailed=mock["category"],
+                confidence="MOCK",
+                is_mock=True,
+            )
+        return builder.build()
+
+    @classmethod
+    def from_dicts(cls, transactions: Iterable[Dict[str, Any]]) -> "TransactionBatch":
+        """Builds a batch from the API's dict shape (for tooling and tests)."""
+        builder = TransactionBatchBuilder()
+        for txn in transactions:
+            builder.append(
+                txn_id=str(txn.get("id", "")),
+                merchant=txn.get("name"),
+                amount_cents=to_cents(txn.get("amount", 0)),
+                day=to_ordinal(txn["date"]),
+                category=txn.get("primary_category", "OTHER"),
+                detailed=txn.get("detailed_category", txn.get("primary_category", "OTHER")),
+                confidence=txn.get("confidence", "UNKNOWN"),
+                logo_url=txn.get("logo_url"),
+                is_mock=bool(txn.get("is_mock", False)),
+            )
+        return builder.build()
+
+    @classmethod
+    def concat(cls, batches: Sequence["TransactionBatch"]) -> "TransactionBatch":
+        if not batches:
+            return cls.empty()
+        strings: List[str] = []
+        index: Dict[str, int] = {}
+        remapped: Dict[str, List[np.ndarray]] = {name: [] for name in _CODE_COLUMNS}
+        for batch in batches:
+            # Map this batch's codes into the merged table; the extra trailing
+            # slot keeps -1 (missing) mapping to -1.
+            remap = np.empty(len(batch.strings) + 1, dtype=np.int32)
+            remap[-1] = -1
+            for code, value in enumerate(batch.strings):
+                if value not in index:
+                    index[value] = len(strings)
+                    strings.append(value)
+                remap[code] = index[value]
+            for name in _CODE_COLUMNS:
+                remapped[name].append(remap[getattr(batch, name)])
+
+        return cls(
+            # Widens to the longest id
+            ids=np.concatenate([b.ids for b in batches]),
+            cents=np.concatenate([b.cents for b in batches]),
+            days=np.concatenate([b.days for b in batches]),
+            is_mock=np.concatenate([b.is_mock for b in batches]),
+            strings=strings,
+            **{name: np.concatenate(columns) for name, columns in remapped.items()},
+        )
+
+    def take(self, order: np.ndarray) -> "TransactionBatch":
+        return TransactionBatch(
+            ids=self.ids[order],
+            cents=self.cents[order],
+            days=self.days[order],
+            is_mock=self.is_mock[order],
+            strings=self.strings,
+            **{name: getattr(self, name)[order] for name in _CODE_COLUMNS},
+        )
+
+    def sorted_newest_first(self) -> "TransactionBatch":
+        # Stable, like list.sort(reverse=True) on the date strings
+        return self.take(np.argsort(-self.days.astype(np.int64), kind="stable"))
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.ids, self.cents, self.days, self.is_mock, *(getattr(self, n) for n in _CODE_COLUMNS))
+        return sum(a.nbytes for a in arrays) + sum(len(s) for s in self.strings)
+
+    def to_json(self) -> bytes:
+        """Encodes the batch as a JSON array of transaction objects.
+
+        Each distinct value (and each distinct date/category/confidence/logo
+        combination) is encoded once; the fragments are gathered by code and
+        concatenated column-wise with numpy, so no per-row dict or per-row
+        encode call is involved.
+        """
+        if not len(self):
+            return b"[]"
+
+        # Trailing b"null" so code -1 (missing) indexes to it
+        strings = [orjson.dumps(value) for value in self.strings] + [b"null"]
+
+        # One code per distinct date/category/confidence/logo/mock combination,
+        # from a mixed-radix key over the (small) per-column codes
+        tail_columns = (self.days, self.category, self.detailed, self.confidence, self.logo, self.is_mock)
+        tail_codes = _combined_codes(
+            [self.days.astype(np.int64) - int(self.days.min())]
+            + [codes.astype(np.int64) + 1 for codes in (self.category, self.detailed, self.confidence, self.logo)]
+            + [self.is_mock.astype(np.int64)]
+        )
+        first = np.zeros(tail_codes.max() + 1, dtype=np.int64)
+        first[tail_codes] = np.arange(len(self))
+        tails = [
+            b',"date":"%s","primary_category":%s,"detailed_category":%s,"confidence":%s,"logo_url":%s,"is_mock":%s}'
+            % (
+                date.fromordinal(day).isoformat().encode(),
+                strings[category],
+                strings[detailed],
+                strings[confidence],
+                strings[logo],
+                b"true" if is_mock else b"false",
+            )
+            for day, category, detailed, confidence, logo, is_mock in zip(*(c[first].tolist() for c in tail_columns))
+        ]
+
+        unique_cents, cents_codes = np.unique(self.cents, return_inverse=True)
+        amounts = [b',"amount":' + orjson.dumps(cents / 100) for cents in unique_cents.tolist()]
+        names = [b'","name":' + value for value in strings]
+
+        rows = np.char.add(b'{"id":"', self.ids)
+        for fragments, codes in ((names, self.merchant), (amounts, cents_codes.ravel()), (tails, tail_codes)):
+            rows = np.char.add(rows, np.array(fragments, dtype=bytes)[codes])
+        # tolist() drops the fixed-width null padding
+        return b"[" + b",".join(rows.tolist()) + b"]"
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        strings = self.strings + [None]  # code -1 -> None
+        iso_days = {day: date.fromordinal(day).isoformat() for day in np.unique(self.days).tolist()}
+        return [
+            {
+                "id": orjson.loads(b'"%s"' % txn_id),
+                "name": strings[merchant],
+                "amount": cents / 100,
+                "date": iso_days[day],
+                "primary_category": strings[category],
+                "detailed_category": strings[detailed],
+                "confidence": strings[confidence],
+                "logo_url": strings[logo],
+                "is_mock": is_mock,
+            }
+            for txn_id, merchant, cents, day, category, detailed, confidence, logo, is_mock in zip(
+                self.ids.tolist(),
+                self.merchant.tolist(),
+                self.cents.tolist(),
+                self.days.tolist(),
+                self.category.tolist(),
+                self.detailed.tolist(),
+                self.confidence.tolist(),
+                self.logo.tolist(),
+                self.is_mock.tolist(),
+            )
+        ]
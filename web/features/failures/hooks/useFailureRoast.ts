@@ -12,6 +12,10 @@ export function useFailureRoast(payload: FailurePayload) {
   const objectUrlRef = useRef<string | null>(null);
 
   const cleanup = useCallback(() => {
+    if (typeof window !== "undefined") {
+      window.speechSynthesis?.cancel();
+    }
+
     if (audioRef.current) {
       audioRef.current.pause();
       audioRef.current = null;
@@ -31,8 +35,16 @@ export function useFailureRoast(payload: FailurePayload) {
       setStatus("loading");
       cleanup();
 
-      const blob = await fetchFailureRoast(payload);
-      const objectUrl = URL.createObjectURL(blob);
+      const result = await fetchFailureRoast(payload);
+      if (result.kind === "text") {
+        const utterance = new SpeechSynthesisUtterance(result.text);
+        utterance.onend = () => setStatus("idle");
+        window.speechSynthesis.speak(utterance);
+        setStatus("playing");
+        return;
+      }
+
+      const objectUrl = result.url;
       objectUrlRef.current = objectUrl;
 
       const audio = new Audio(objectUrl);
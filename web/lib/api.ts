@@ -1,7 +1,42 @@
 import { API_BASE_URL } from "@/lib/config";
 import type { FailurePayload, MatchConfig } from "@/types/domain";
 
-export async function fetchFailureRoast(payload: FailurePayload): Promise<Blob> {
+// Audio normally (an object URL to play); text when the server is saturated
+// and skips synthesis
+export type RoastResult = { kind: "audio"; url: string } | { kind: "text"; text: string };
+
+function canStreamMp3(): boolean {
+  return typeof MediaSource !== "undefined" && MediaSource.isTypeSupported("audio/mpeg");
+}
+
+// Feeds the response body into a MediaSource so playback starts with the
+// first audio frames instead of after the whole clip has downloaded.
+function streamingAudioUrl(body: NonNullable<Response["body"]>): string {
+  const mediaSource = new MediaSource();
+  mediaSource.addEventListener(
+    "sourceopen",
+    async () => {
+      const buffer = mediaSource.addSourceBuffer("audio/mpeg");
+      const reader = body.getReader();
+      try {
+        for (;;) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffer.appendBuffer(value);
+          await new Promise((resolve) => buffer.addEventListener("updateend", resolve, { once: true }));
+        }
+        mediaSource.endOfStream();
+      } catch {
+        if (mediaSource.readyState === "open") mediaSource.endOfStream("network");
+      }
+    },
+    { once: true }
+  );
+  return URL.createObjectURL(mediaSource);
+}
+
+export async function fetchFailureRoast(payload: FailurePayload): Promise<RoastResult> {
+  const stream = canStreamMp3();
   const response = await fetch(`${API_BASE_URL}/api/failure-roast`, {
     method: "POST",
     headers: {
@@ -12,6 +47,8 @@ export async function fetchFailureRoast(payload: FailurePayload): Promise<Blob>
       failed_goal: payload.failedGoal,
       amount: payload.amount,
       anti_charity: payload.antiCharity,
+      contract_id: payload.contractId,
+      stream,
     })
   });
 
@@ -25,7 +62,15 @@ export async function fetchFailureRoast(payload: FailurePayload): Promise<Blob>
     }
   }
 
-  return response.blob();
+  if ((response.headers.get("content-type") ?? "").includes("application/json")) {
+    const body = (await response.json()) as { text: string };
+    return { kind: "text", text: body.text };
+  }
+
+  if (stream && response.body) {
+    return { kind: "audio", url: streamingAudioUrl(response.body) };
+  }
+  return { kind: "audio", url: URL.createObjectURL(await response.blob()) };
 }
 
 export async function analyzePact(title: string): Promise<MatchConfig> {
@@ -45,4 +45,7 @@ export type FailurePayload = {
   amount: string;
   antiCharity: string;
   trigger?: string;
+  // Server contract id; the server then fills in goal, amount and recipient
+  // itself and can serve a pre-rendered clip
+  contractId?: number;
 };